@@ -17,6 +17,8 @@ fallback key, preventing session decryption issues. For production,
 explicitly setting the FLASK_SECRET_KEY environment variable is still
 the recommended best practice.
 """
+from __future__ import annotations
+
 
 # --- Start: Fix for direct script execution and relative imports ---
 # This block MUST be at the very top of the file, before any other imports.
@@ -48,6 +50,9 @@ from flask import session as flask_session # Alias for clarity
 from llmcore import LLMCore, LLMCoreError, ConfigError as LLMCoreConfigError
 from llmcore import ProviderError, ContextLengthError, SessionNotFoundError
 from llmcore.models import Message as LLMCoreMessage, ChatSession as LLMCoreChatSession, Role as LLMCoreRole
+from pydantic import ValidationError
+
+from .json_provider import OrjsonProvider
 
 # --- Application Version ---
 try:
@@ -74,6 +79,7 @@ logger.setLevel(logging.DEBUG)
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
+app.json = OrjsonProvider(app) # jsonify, request.get_json and the session cookie encode via orjson
 
 _generated_flask_secret_key_at_module_load = secrets.token_hex(32)
 logger.info(f"Flask SECRET_KEY fallback generated at module load. For production, set FLASK_SECRET_KEY env var.")
@@ -193,12 +199,52 @@ def log_session_info_before_request():
             # Add other relevant session keys if needed
             "flask_session_full_content_keys": list(flask_session.keys())
         }
-        logger.debug(f"FLASK_SESSION_STATE_SUMMARY (Before Request {request.path}): {session_details_to_log}")
+        logger.debug("FLASK_SESSION_STATE_SUMMARY (Before Request %s): %s", request.path, session_details_to_log)
+
+
+# --- LLMCore Availability Gate ---
+def llmcore_optional(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Marks an /api view as usable without LLMCore (e.g. pure Flask-session settings)."""
+    view.llmcore_optional = True # type: ignore[attr-defined]
+    return view
+
+@app.before_request
+def require_llmcore_for_api_requests() -> Any:
+    """
+    Answers /api requests with a 503 while LLMCore is unavailable, so individual
+    handlers need not repeat the check. Views marked `@llmcore_optional` are let through.
+    """
+    if llmcore_instance is not None or not request.path.startswith("/api/"):
+        return None
+    view = app.view_functions.get(request.endpoint) if request.endpoint else None
+    if view is None or getattr(view, "llmcore_optional", False):
+        return None
+    logger.error(f"Rejected {request.method} {request.path}: LLM service (llmcore_instance) is not available.")
+    return jsonify({"error": "LLM service not available."}), 503
+
+
+# --- Request Validation Errors ---
+@app.errorhandler(ValidationError)
+def handle_request_validation_error(error: ValidationError) -> Any:
+    """Answers request payloads rejected by the pydantic models in models.py with a 400."""
+    logger.warning(f"Rejected invalid request payload for {request.path}: {error.error_count()} error(s).")
+    return jsonify({
+        "error": "Invalid request payload.",
+        "details": json.loads(error.json(include_url=False)),
+    }), 400
 
 
 # --- Thread-Safe Asyncio Event Loop Management ---
 _thread_local = threading.local()
 
+# Per-thread loops are uvloop loops when the optional `uvloop` extra is installed;
+# otherwise (and on Windows, which uvloop does not support) the stdlib loop is used.
+try:
+    import uvloop
+    _new_event_loop: Callable[[], asyncio.AbstractEventLoop] = uvloop.new_event_loop
+except ImportError:
+    _new_event_loop = asyncio.new_event_loop
+
 def get_or_create_event_loop() -> asyncio.AbstractEventLoop:
     """
     Gets or creates a new event loop for the current thread and sets it as the active loop.
@@ -207,7 +253,7 @@ def get_or_create_event_loop() -> asyncio.AbstractEventLoop:
     """
     if not hasattr(_thread_local, 'loop') or _thread_local.loop.is_closed():
         logger.debug("Creating new persistent event loop for this thread.")
-        _thread_local.loop = asyncio.new_event_loop()
+        _thread_local.loop = _new_event_loop()
         asyncio.set_event_loop(_thread_local.loop)
     return _thread_local.loop
 
@@ -229,49 +275,89 @@ def run_async_generator_synchronously(async_gen_func: Callable[..., AsyncGenerat
     Runs an asynchronous generator function synchronously from a synchronous context.
     This is necessary for streaming responses in Flask with `stream_with_context`.
     It uses the same thread-local event loop management as `async_to_sync_in_flask`.
+
+    The async generator is always closed (`aclose()`) when this generator finishes
+    or is closed by the server, e.g. because the client disconnected mid-stream,
+    so its `finally` blocks (task cancellation, temp directory cleanup) run
+    right away instead of whenever the abandoned generator is garbage collected.
     """
     utility_logger = logging.getLogger("llmchat_web.utils.async_gen_sync_runner")
     loop = get_or_create_event_loop()
-    utility_logger.debug(f"Using thread-local event loop for run_async_generator_synchronously of {async_gen_func.__name__}")
+    utility_logger.debug("Using thread-local event loop for run_async_generator_synchronously of %s", async_gen_func.__name__)
     async_gen = async_gen_func(*args, **kwargs)
-    while True:
+    try:
+        while True:
+            try:
+                # Run the next step of the generator on the thread's persistent loop
+                item = loop.run_until_complete(async_gen.__anext__())
+                yield item
+            except StopAsyncIteration:
+                utility_logger.debug("Async generator %s completed.", async_gen_func.__name__)
+                break
+            except Exception as e_inner:
+                utility_logger.error(f"Error during iteration of async generator {async_gen_func.__name__}: {e_inner}", exc_info=True)
+                break
+    finally:
         try:
-            # Run the next step of the generator on the thread's persistent loop
-            item = loop.run_until_complete(async_gen.__anext__())
-            yield item
-        except StopAsyncIteration:
-            utility_logger.debug(f"Async generator {async_gen_func.__name__} completed.")
-            break
-        except Exception as e_inner:
-            utility_logger.error(f"Error during iteration of async generator {async_gen_func.__name__}: {e_inner}", exc_info=True)
-            break
+            loop.run_until_complete(async_gen.aclose())
+        except Exception as e_close:
+            utility_logger.warning(f"Error closing async generator {async_gen_func.__name__}: {e_close}")
     # The loop is intentionally not closed here, as it's managed per-thread.
 
+# --- LLMCore Config Defaults ---
+# The default provider and per-provider default models do not change once LLMCore
+# is configured, yet routes look them up on every request. Values are memoized per
+# config object, so a re-created LLMCore instance starts from a fresh cache.
+_config_defaults_source: Any = None
+_config_defaults: Dict[str, Any] = {}
+_config_defaults_lock = threading.Lock()
+
+def _get_config_default(key: str) -> Any:
+    global _config_defaults_source
+    config = llmcore_instance.config if llmcore_instance else None
+    if config is None: return None
+    with _config_defaults_lock:
+        if _config_defaults_source is not config:
+            _config_defaults.clear(); _config_defaults_source = config
+        if key not in _config_defaults:
+            _config_defaults[key] = config.get(key)
+        return _config_defaults[key]
+
+def get_default_provider_name() -> Optional[str]:
+    """Returns LLMCore's configured `llmcore.default_provider`, or None."""
+    return _get_config_default("llmcore.default_provider")
+
+def get_default_model_name(provider_name: Optional[str]) -> Optional[str]:
+    """Returns the configured `providers.<name>.default_model` for a provider, or None."""
+    if not provider_name: return None
+    return _get_config_default(f"providers.{provider_name}.default_model")
+
 # --- Session Helper Functions ---
 def get_current_web_session_id() -> Optional[str]:
     return flask_session.get('current_llm_session_id')
 
 def set_current_web_session_id(llmcore_session_id: Optional[str]):
     flask_session['current_llm_session_id'] = llmcore_session_id
-    logger.debug(f"Flask session 'current_llm_session_id' set to: {llmcore_session_id}")
+    logger.debug("Flask session 'current_llm_session_id' set to: %s", llmcore_session_id)
+
+def context_usage_from_details(context_details: Any) -> Optional[Dict[str, Any]]:
+    """Builds the UI's context usage summary from LLMCore's last-interaction context details."""
+    if not context_details: return None
+    tokens_used = context_details.final_token_count if context_details.final_token_count is not None else 0
+    max_tokens = context_details.max_tokens_for_model if context_details.max_tokens_for_model is not None else 0
+    return {"tokens_used": tokens_used, "max_tokens": max_tokens, "usage_percentage": (tokens_used / max_tokens * 100) if max_tokens > 0 else 0}
 
 async def get_context_usage_info(session_id: Optional[str]) -> Optional[Dict[str, Any]]:
     if not llmcore_instance or not session_id: return None
     try:
-        context_details = await llmcore_instance.get_last_interaction_context_info(session_id)
-        if context_details:
-            tokens_used = context_details.final_token_count if context_details.final_token_count is not None else 0
-            max_tokens = context_details.max_tokens_for_model if context_details.max_tokens_for_model is not None else 0
-            return {"tokens_used": tokens_used, "max_tokens": max_tokens, "usage_percentage": (tokens_used / max_tokens * 100) if max_tokens > 0 else 0}
+        return context_usage_from_details(await llmcore_instance.get_last_interaction_context_info(session_id))
     except Exception as e_ctx_info: logger.error(f"Error fetching context usage info for session {session_id}: {e_ctx_info}")
     return None
 
 # --- Register Blueprints ---
 from . import routes as routes_package
-for bp in routes_package.all_blueprints:
-    app.register_blueprint(bp)
-    logger.info(f"Registered blueprint '{bp.name}' with url_prefix '{bp.url_prefix}'.")
-logger.info(f"All blueprints from 'llmchat_web.routes' package registered.")
+routes_package.register_all(app)
+logger.info("All blueprints from 'llmchat_web.routes' package registered.")
 
 # --- Main Execution ---
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+# llmchat_web/json_provider.py
+"""
+orjson-backed JSON provider for the Flask app.
+
+Installed as `app.json`, it makes `jsonify`, `request.get_json` and the session
+cookie serializer use orjson instead of the stdlib `json` module. Output matches
+Flask's default provider except for whitespace and escaping: keys are sorted when
+`sort_keys` is set (the default); dates and datetimes are still passed to
+Flask's `default` hook and so come out as HTTP dates, as do other types orjson
+lacks (e.g. `Decimal`). Bodies are compact (no spaces after separators) and
+non-ASCII text is written as UTF-8 instead of `\\uXXXX` escapes. Values orjson
+still cannot encode (e.g. integers wider than 64 bits), and `dumps` calls with
+options it does not mirror, are handed to Flask's default provider.
+"""
+
+import logging
+from typing import Any, Union
+
+import orjson
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+# Non-str dict keys are stringified, as the stdlib encoder does. Dates and
+# datetimes are left to `default`, which formats them as HTTP dates like Flask does.
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+_COMPACT_SEPARATORS = (",", ":")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """`DefaultJSONProvider` that encodes and decodes with orjson where it can."""
+
+    def _dumps_bytes(self, obj: Any, sort_keys: bool, indent: bool = False) -> bytes:
+        options = _ORJSON_OPTIONS
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=options)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        sort_keys = kwargs.get("sort_keys", self.sort_keys)
+        separators = kwargs.get("separators")
+        # Anything beyond key sorting and compact separators is left to the stdlib encoder.
+        if set(kwargs) - {"sort_keys", "separators"} or separators not in (None, _COMPACT_SEPARATORS):
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._dumps_bytes(obj, sort_keys).decode("utf-8")
+        except TypeError:
+            logger.debug("orjson could not encode %s; using the stdlib encoder.", type(obj).__name__)
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        try:
+            body = self._dumps_bytes(obj, self.sort_keys, indent=indent) + b"\n"
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
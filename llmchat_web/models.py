@@ -6,24 +6,139 @@ specific to the llmchat-web application.
 This module helps ensure data consistency and provides clear contracts
 for the web API.
 
-Currently, API request/response data is handled directly as dictionaries
-in the route handlers. Pydantic models can be introduced here for
-more robust validation as the API evolves.
+Request bodies of the JSON POST endpoints are validated against the
+`*Request` models below in a single `model_validate_json` pass. A failed
+validation raises `pydantic.ValidationError`, which the app-level error
+handler turns into a 400 response.
 """
 
 import logging
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field # Example import
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 logger = logging.getLogger(__name__)
 
-# Example Pydantic model (can be expanded later)
-# class ChatMessageRequest(BaseModel):
-#     message: str = Field(..., min_length=1, description="The user's chat message.")
-#     session_id: Optional[str] = Field(None, description="Optional LLMCore session ID.")
-#     stream: bool = Field(default=False, description="Whether to request a streaming response.")
-#     # ... other potential fields like RAG parameters ...
 
+class _RequestModel(BaseModel):
+    """Base for request payload models; accepts both field names and aliases."""
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# --- RAG ---
+
+class RagSettingsUpdateRequest(_RequestModel):
+    """Payload of POST /api/rag/settings/update. Omitted fields keep their session values."""
+    enabled: Optional[bool] = None
+    collection_name: Optional[str] = Field(None, alias="collectionName")
+    k_value: Optional[int] = Field(None, alias="kValue")
+    filter: Optional[Any] = None # Validated by the route: dict, empty dict or null
+
+
+class RagSearchRequest(_RequestModel):
+    """Payload of POST /api/rag/direct_search. Omitted fields fall back to session RAG settings."""
+    query: str
+    collection_name: Optional[str] = None
+    k: Optional[int] = None
+    filter: Optional[Dict[str, Any]] = None
+
+
+# --- Settings ---
+
+class LlmSettingsUpdateRequest(_RequestModel):
+    """Payload of POST /api/settings/llm/update."""
+    provider_name: str = Field(..., min_length=1)
+    model_name: Optional[str] = None
+
+
+class SystemMessageUpdateRequest(_RequestModel):
+    """Payload of POST /api/settings/system_message/update."""
+    system_message: str = ""
+
+
+def _scalar_to_str(raw: Any) -> Any:
+    # Template values are always stored as strings; accept plain numbers too.
+    return str(raw) if isinstance(raw, (int, float)) else raw
+
+
+class PromptTemplateValueRequest(_RequestModel):
+    """Payload of POST /api/settings/prompt_template_values/update."""
+    key: str
+    value: str
+
+    @field_validator("key", "value", mode="before")
+    @classmethod
+    def _scalars_to_str(cls, raw: Any) -> Any:
+        return _scalar_to_str(raw)
+
+
+class PromptTemplateBatchUpdateRequest(_RequestModel):
+    """Payload of POST /api/settings/prompt_template_values/batch_update."""
+    values: Dict[str, str]
+
+    @field_validator("values", mode="before")
+    @classmethod
+    def _scalars_to_str(cls, raw: Any) -> Any:
+        if not isinstance(raw, dict):
+            return raw
+        return {key: _scalar_to_str(value) for key, value in raw.items()}
+
+
+class PromptTemplateKeyRequest(_RequestModel):
+    """Payload of POST /api/settings/prompt_template_values/delete_key."""
+    key: str
+
+
+# --- Chat & Staged Context ---
+
+class StagedItemSpec(_RequestModel):
+    """
+    One client-side staged context item, as sent in a chat's
+    `active_context_specification` or a preview's `staged_items`.
+    """
+    type: Optional[str] = None # "message_history", "workspace_item", "file_content" or "text_content"
+    id_ref: Optional[str] = None
+    content: Optional[str] = None
+    path: Optional[str] = None
+    spec_item_id: Optional[str] = None
+    no_truncate: bool = False
+
+
+class ChatRequest(_RequestModel):
+    """Payload of POST /api/chat. An omitted session_id falls back to the web session's current one."""
+    message: str
+    session_id: Optional[str] = None
+    stream: bool = True
+    raw_prompt_workbench_content: Optional[str] = None
+    active_context_specification: Optional[List[StagedItemSpec]] = None
+    message_inclusion_map: Optional[Dict[str, bool]] = None
+
+
+# --- Workspace & Context Preview ---
+
+class WorkspaceTextRequest(_RequestModel):
+    """Payload of POST /api/sessions/<session_id>/workspace/add_text."""
+    content: str
+    item_id: Optional[str] = None
+
+
+class WorkspaceFileRequest(_RequestModel):
+    """Payload of POST /api/sessions/<session_id>/workspace/add_file."""
+    file_path: str
+    item_id: Optional[str] = None
+
+
+class WorkspaceMessageRequest(_RequestModel):
+    """Payload of POST /api/sessions/<session_id>/workspace/add_from_message."""
+    message_id: str
+
+
+class ContextPreviewRequest(_RequestModel):
+    """Payload of POST /api/sessions/<session_id>/context/preview."""
+    current_query: Optional[str] = None
+    staged_items: List[StagedItemSpec] = Field(default_factory=list)
+
+
+# Example Pydantic model (can be expanded later)
 # class ChatMessageResponse(BaseModel):
 #     role: str
 #     content: str
@@ -39,4 +154,4 @@ logger = logging.getLogger(__name__)
 #     message_count: int
 #     # ...
 
-logger.info("llmchat_web.models initialized (currently a placeholder).")
+logger.info("llmchat_web.models initialized.")
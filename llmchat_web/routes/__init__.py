@@ -3,12 +3,13 @@
 Initialization module for the Flask routes sub-package.
 
 This module defines and collects Blueprints for different parts of the
-llmchat-web API. These blueprints are then registered with the main
-Flask application. It also imports the route modules to ensure
-routes are registered on the blueprints.
+llmchat-web API. The route modules that attach views to these blueprints
+are only imported by `register_all`, which the main Flask application
+calls once it is fully set up.
 """
+import importlib
 import logging
-from flask import Blueprint
+from flask import Blueprint, Flask
 
 # --- Logger for this routes package ---
 logger = logging.getLogger("llmchat_web.routes")
@@ -25,21 +26,22 @@ settings_bp = Blueprint('settings_bp', __name__, url_prefix='/api/settings')
 preset_bp = Blueprint('preset_bp', __name__, url_prefix='/api/presets')
 
 
-# --- Import route modules to register their routes with the blueprints ---
-# These imports are crucial for the @bp.route decorators in each file to execute.
-from . import core_routes
-from . import chat_routes
-from . import session_routes
-from . import workspace_routes
-from . import rag_routes
-from . import ingest_routes
-from . import settings_routes
-from . import preset_routes
-
-logger.info("Route modules imported and routes should be registered on their respective blueprints.")
-
-# List of all blueprints to be registered by the app
-all_blueprints = [
+# --- Route modules ---
+# Importing a module runs its @bp.route decorators. They import shared helpers
+# from llmchat_web.app, so they are loaded by register_all() rather than here.
+_ROUTE_MODULES = (
+    "core_routes",
+    "chat_routes",
+    "session_routes",
+    "workspace_routes",
+    "rag_routes",
+    "ingest_routes",
+    "settings_routes",
+    "preset_routes",
+)
+
+# All blueprints to be registered by the app, as an immutable tuple
+all_blueprints: tuple[Blueprint, ...] = (
     core_bp,
     chat_bp,
     session_bp,
@@ -48,6 +50,14 @@ all_blueprints = [
     ingest_bp,
     settings_bp,
     preset_bp,
-]
+)
+
 
-logger.info(f"Defined and collected {len(all_blueprints)} blueprints for llmchat_web routes.")
+def register_all(app: Flask) -> None:
+    """Imports every route module and registers all blueprints on `app`."""
+    for module_name in _ROUTE_MODULES:
+        importlib.import_module(f".{module_name}", __package__)
+    logger.info("Route modules imported; registering %s blueprints.", len(all_blueprints))
+    for bp in all_blueprints:
+        app.register_blueprint(bp)
+        logger.info("Registered blueprint '%s' with url_prefix '%s'.", bp.name, bp.url_prefix)
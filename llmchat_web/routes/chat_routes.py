@@ -5,25 +5,40 @@ Handles sending messages, streaming responses, and related chat operations.
 Now includes emitting RAG results in the SSE stream and handling UI-managed
 context overrides.
 """
+from __future__ import annotations
+
 import asyncio
-import json
+import hashlib
 import logging
-import uuid
-from typing import Any, AsyncGenerator, Dict, Optional, List, Union
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Awaitable, Dict, Optional, List, Tuple, Union
 from pathlib import Path
 import aiofiles # Added for fallback file reading
+import orjson
 from werkzeug.utils import secure_filename # Though not used here, good practice if file names are manipulated
 
-from flask import Response, jsonify, request, stream_with_context
+from flask import jsonify, request
 from flask import session as flask_session
 
 from . import chat_bp
+from ..models import ChatRequest, StagedItemSpec
+from .utils import (
+    TTLCache, batched, invalidate_session_caches, json_response, json_stream_response, parse_json_body,
+    request_fingerprint, sse_response, staged_items_cache
+)
 from ..app import (
     llmcore_instance,
     async_to_sync_in_flask,
     run_async_generator_synchronously,
+    context_usage_from_details,
     get_context_usage_info,
     get_current_web_session_id,
+    get_default_model_name,
+    get_default_provider_name,
     logger as app_logger
 )
 from llmcore import (
@@ -44,21 +59,139 @@ if not logger.handlers and app_logger:
 async def _get_last_assistant_message_id(session_id: Optional[str]) -> Optional[str]:
     """Helper to get the ID of the last assistant message in a session."""
     if not llmcore_instance or not session_id:
-        logger.warning(f"_get_last_assistant_message_id called with no llmcore_instance or session_id ({session_id})")
+        logger.warning("_get_last_assistant_message_id called with no llmcore_instance or session_id (%s)", session_id)
         return None
     try:
         session_obj = await llmcore_instance.get_session(session_id)
         if session_obj and session_obj.messages:
             for msg in reversed(session_obj.messages):
                 if msg.role == LLMCoreRole.ASSISTANT: return msg.id
-        logger.debug(f"No assistant message found in session {session_id} to get ID from.")
-    except SessionNotFoundError: logger.warning(f"Session {session_id} not found while trying to get last assistant message ID.")
-    except LLMCoreError as e: logger.error(f"LLMCoreError getting last assistant message ID for session {session_id}: {e}")
-    except Exception as e_unexp: logger.error(f"Unexpected error in _get_last_assistant_message_id for session {session_id}: {e_unexp}", exc_info=True)
+        logger.debug("No assistant message found in session %s to get ID from.", session_id)
+    except SessionNotFoundError: logger.warning("Session %s not found while trying to get last assistant message ID.", session_id)
+    except LLMCoreError as e: logger.error("LLMCoreError getting last assistant message ID for session %s: %s", session_id, e)
+    except Exception as e_unexp: logger.error("Unexpected error in _get_last_assistant_message_id for session %s: %s", session_id, e_unexp, exc_info=True)
     return None
 
+# Staged files larger than this are not read into the prompt; a short notice is
+# staged in their place so the omission is visible to the user and the model.
+MAX_STAGED_FILE_BYTES = int(os.environ.get("LLMCHAT_WEB_MAX_STAGED_FILE_BYTES", 8 * 1024 * 1024))
+
+# Decoded text of recently staged files, keyed by (absolute path, mtime_ns, size) so
+# an edited file misses. The same files are typically re-staged on every turn of a
+# conversation. Bounded by total characters held; shared across worker threads.
+STAGED_FILE_CACHE_MAX_CHARS = 64 * 1024 * 1024
+_STAGED_FILE_CACHE: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_STAGED_FILE_CACHE_CHARS = 0
+_STAGED_FILE_CACHE_LOCK = threading.Lock()
+
+def _cache_staged_file(key: Tuple[str, int, int], content: str) -> None:
+    global _STAGED_FILE_CACHE_CHARS
+    if len(content) > STAGED_FILE_CACHE_MAX_CHARS:
+        return
+    with _STAGED_FILE_CACHE_LOCK:
+        previous = _STAGED_FILE_CACHE.pop(key, None)
+        if previous is not None:
+            _STAGED_FILE_CACHE_CHARS -= len(previous)
+        _STAGED_FILE_CACHE[key] = content
+        _STAGED_FILE_CACHE_CHARS += len(content)
+        while _STAGED_FILE_CACHE_CHARS > STAGED_FILE_CACHE_MAX_CHARS:
+            _, evicted = _STAGED_FILE_CACHE.popitem(last=False)
+            _STAGED_FILE_CACHE_CHARS -= len(evicted)
+
+# Staged text_content longer than this is truncated unless the item is marked no_truncate.
+MAX_STAGED_TEXT_CHARS = int(os.environ.get("LLMCHAT_WEB_MAX_STAGED_TEXT_CHARS", 1_000_000))
+
+def _staged_item_fallback_id(js_item: StagedItemSpec) -> str:
+    """
+    ID for a staged item the client sent without a spec_item_id, derived from its
+    type and content (or path) so the same item keeps the same ID on every turn.
+    """
+    identity = orjson.dumps([js_item.type, js_item.content, js_item.path])
+    return f"staged_{hashlib.sha1(identity).hexdigest()[:16]}"
+
+def _staged_context_item(
+    item_id: str, item_type: LLMCoreContextItemType, content: str, source_id: str, no_truncate: bool,
+    **extra_metadata: Any
+) -> LLMCoreContextItem:
+    """Builds the ContextItem for a staged file or text, tagged as staged by llmchat-web."""
+    metadata = {"llmchat_web_staged": True, "ignore_char_limit": no_truncate}
+    metadata.update(extra_metadata)
+    return LLMCoreContextItem(id=item_id, type=item_type, content=content, source_id=source_id, metadata=metadata)
+
+async def _streamed_assistant_message_id(response_generator: Any, session_id: Optional[str]) -> Optional[str]:
+    """
+    ID of the reply just streamed: LLMCore stream objects that expose `message_id`
+    spare a session fetch; otherwise it is looked up from the session.
+    """
+    return getattr(response_generator, "message_id", None) or await _get_last_assistant_message_id(session_id)
+
+def _read_staged_file(file_path_obj: Path) -> Optional[str]:
+    """Reads a staged file's text (blocking; run via asyncio.to_thread), or None if it is not a file."""
+    try:
+        file_stat = file_path_obj.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not stat.S_ISREG(file_stat.st_mode):
+        return None
+    if file_stat.st_size > MAX_STAGED_FILE_BYTES:
+        logger.warning("Staged file '%s' is %s bytes, over the %s-byte limit; not reading it.", file_path_obj, file_stat.st_size, MAX_STAGED_FILE_BYTES)
+        return f"[File '{file_path_obj.name}' was not included: its size ({file_stat.st_size} bytes) exceeds the {MAX_STAGED_FILE_BYTES}-byte limit for staged files.]"
+    cache_key = (os.path.abspath(file_path_obj), file_stat.st_mtime_ns, file_stat.st_size)
+    with _STAGED_FILE_CACHE_LOCK:
+        content = _STAGED_FILE_CACHE.get(cache_key)
+        if content is not None:
+            _STAGED_FILE_CACHE.move_to_end(cache_key)
+            return content
+    content = file_path_obj.read_text(encoding='utf-8', errors='ignore')
+    _cache_staged_file(cache_key, content)
+    return content
+
+# Upper bound on staged-item fetches and file reads in flight at once for one
+# request, so a long staged list cannot monopolize the to_thread worker pool.
+STAGED_RESOLVE_CONCURRENCY = 8
+
+async def _gather_bounded(awaitables: List[Awaitable[Any]]) -> List[Any]:
+    """`asyncio.gather(..., return_exceptions=True)`, with at most STAGED_RESOLVE_CONCURRENCY running."""
+    limit = asyncio.Semaphore(STAGED_RESOLVE_CONCURRENCY)
+
+    async def run(awaitable: Awaitable[Any]) -> Any:
+        async with limit:
+            return await awaitable
+
+    return await asyncio.gather(*(run(awaitable) for awaitable in awaitables), return_exceptions=True)
+
+async def _fetch_staged_workspace_items(
+    session_id: Optional[str], workspace_refs: List[Tuple[int, str]]
+) -> Dict[int, Any]:
+    """
+    Fetches the workspace items referenced by `workspace_refs` ((index, id_ref) pairs),
+    keyed by index. Each value is the item, None, or the exception raised fetching it.
+
+    LLMCore has no get-by-ids call, so when several items are staged the session's
+    items are listed once and looked up by id; only ids missing from that listing
+    (or a single staged item) fall back to `get_context_item`, run concurrently.
+    """
+    items_by_index: Dict[int, Any] = {}
+    if not workspace_refs:
+        return items_by_index
+    if len(workspace_refs) > 1:
+        try:
+            session_items = await llmcore_instance.get_session_context_items(session_id)
+            session_items_by_id = {item.id: item for item in session_items}
+            for index, item_id_ref in workspace_refs:
+                if item_id_ref in session_items_by_id:
+                    items_by_index[index] = session_items_by_id[item_id_ref]
+        except Exception as e_list:
+            logger.warning("Listing workspace items for session %s failed (%s); fetching staged items one by one.", session_id, e_list)
+    missing_refs = [(index, item_id_ref) for index, item_id_ref in workspace_refs if index not in items_by_index]
+    missing_results = await _gather_bounded(
+        [llmcore_instance.get_context_item(session_id, item_id_ref) for _, item_id_ref in missing_refs]
+    )
+    items_by_index.update((index, result) for (index, _), result in zip(missing_refs, missing_results))
+    return items_by_index
+
 async def _resolve_staged_items_for_core(
-    staged_items_from_js: List[Dict[str, Any]],
+    staged_items_from_js: List[StagedItemSpec],
     session_id_for_staging: Optional[str]
 ) -> List[Union[LLMCoreMessage, LLMCoreContextItem]]:
     """
@@ -67,30 +200,78 @@ async def _resolve_staged_items_for_core(
 
     This function now robustly handles 'file_content' items by reading the
     file from the specified server-side path, and includes a fallback to re-read
-    a workspace file's content if it appears to be empty.
+    a workspace file's content if it appears to be empty. The session is fetched
+    at most once for all staged messages, and workspace items are fetched
+    concurrently; results keep the order of `staged_items_from_js`.
+
+    Message and workspace resolutions are memoized briefly per session and
+    staged list (see `staged_items_cache`), so a preview and the chat submission
+    that follows it fetch them only once; callers get their own copies. Staged
+    files are re-checked on every call (their text is cached by mtime and size
+    in `_read_staged_file`), so an edited file is never sent stale.
 
     Args:
-        staged_items_from_js: The list of item dictionaries from the client.
+        staged_items_from_js: The staged item specs sent by the client.
         session_id_for_staging: The ID of the session to resolve against.
 
     Returns:
         A list of resolved LLMCoreMessage or LLMCoreContextItem objects.
     """
+    if not staged_items_from_js: return []
     if not llmcore_instance: logger.error("_resolve_staged_items_for_core called but llmcore_instance is None."); return []
     explicitly_staged_items: List[Union[LLMCoreMessage, LLMCoreContextItem]] = []
-    if not staged_items_from_js: return explicitly_staged_items
-    logger.debug(f"Resolving {len(staged_items_from_js)} staged items from JS for session {session_id_for_staging}.")
-    for js_item in staged_items_from_js:
-        item_type_str = js_item.get('type'); item_content = js_item.get('content'); item_path = js_item.get('path')
-        item_id_ref = js_item.get('id_ref'); item_spec_id = js_item.get('spec_item_id', f"staged_{uuid.uuid4().hex[:8]}")
-        no_truncate = js_item.get('no_truncate', False); resolved_item: Optional[Union[LLMCoreMessage, LLMCoreContextItem]] = None
+    cache_key = (session_id_for_staging, request_fingerprint(staged_items_from_js))
+    # Resolved non-file items by their index in the staged list.
+    cached_by_index: Optional[Dict[int, Union[LLMCoreMessage, LLMCoreContextItem]]] = staged_items_cache.get(cache_key)
+    resolved_by_index: Dict[int, Union[LLMCoreMessage, LLMCoreContextItem]] = {}
+    if cached_by_index is not None:
+        logger.debug("Reusing %s resolved staged items for session %s.", len(cached_by_index), session_id_for_staging)
+    else:
+        logger.debug("Resolving %s staged items from JS for session %s.", len(staged_items_from_js), session_id_for_staging)
+
+    # Fetch what the staged items reference up front: the session (once, however
+    # many messages are staged) and all workspace items concurrently.
+    session_messages_by_id: Dict[str, LLMCoreMessage] = {}
+    workspace_refs: List[Tuple[int, str]] = []
+    if session_id_for_staging and cached_by_index is None:
+        workspace_refs = [
+            (index, js_item.id_ref) for index, js_item in enumerate(staged_items_from_js)
+            if js_item.type == "workspace_item" and js_item.id_ref
+        ]
+        if any(js_item.type == "message_history" and js_item.id_ref for js_item in staged_items_from_js):
+            try:
+                sess_obj = await llmcore_instance.get_session(session_id_for_staging)
+                if sess_obj: session_messages_by_id = {m.id: m for m in sess_obj.messages}
+            except Exception as e_sess:
+                logger.error("Error loading session %s to resolve staged messages: %s", session_id_for_staging, e_sess, exc_info=True)
+    workspace_items_by_index = await _fetch_staged_workspace_items(session_id_for_staging, workspace_refs)
+
+    # Staged server-side files are read on worker threads, concurrently, instead of
+    # blocking the event loop with one read_text() after another.
+    file_refs = [
+        (index, Path(js_item.path).expanduser()) for index, js_item in enumerate(staged_items_from_js)
+        if js_item.type == "file_content" and js_item.path
+    ]
+    file_results = await _gather_bounded(
+        [asyncio.to_thread(_read_staged_file, file_path_obj) for _, file_path_obj in file_refs]
+    )
+    file_contents_by_index = {index: result for (index, _), result in zip(file_refs, file_results)}
+
+    for index, js_item in enumerate(staged_items_from_js):
+        if cached_by_index is not None and js_item.type != "file_content":
+            cached_item = cached_by_index.get(index)
+            if cached_item is not None: explicitly_staged_items.append(cached_item.model_copy(deep=True))
+            continue
+        item_type_str = js_item.type; item_content = js_item.content; item_path = js_item.path
+        item_id_ref = js_item.id_ref; item_spec_id = js_item.spec_item_id or _staged_item_fallback_id(js_item)
+        no_truncate = js_item.no_truncate; resolved_item: Optional[Union[LLMCoreMessage, LLMCoreContextItem]] = None
         try:
             if item_type_str == "message_history" and item_id_ref and session_id_for_staging:
-                sess_obj = await llmcore_instance.get_session(session_id_for_staging)
-                if sess_obj: resolved_item = next((m for m in sess_obj.messages if m.id == item_id_ref), None)
-                if resolved_item: logger.debug(f"Resolved staged message_history item: {item_id_ref}")
+                resolved_item = session_messages_by_id.get(item_id_ref)
+                if resolved_item: logger.debug("Resolved staged message_history item: %s", item_id_ref)
             elif item_type_str == "workspace_item" and item_id_ref and session_id_for_staging:
-                resolved_item = await llmcore_instance.get_context_item(session_id_for_staging, item_id_ref)
+                resolved_item = workspace_items_by_index[index]
+                if isinstance(resolved_item, BaseException): raise resolved_item
 
                 # --- Rationale Block: fix(web): Ensure staged workspace file content is always loaded ---
                 # Pre-state: The function trusted that a retrieved workspace item of type USER_FILE
@@ -108,7 +289,7 @@ async def _resolve_staged_items_for_core(
                 #             recover by reading the file from its source path, ensuring the context is
                 #             correctly included.
                 if resolved_item and resolved_item.type == LLMCoreContextItemType.USER_FILE and (resolved_item.content is None or not resolved_item.content.strip()):
-                    logger.warning(f"Workspace item '{resolved_item.id}' is a USER_FILE but has empty/whitespace content. Attempting to re-read from source_id.")
+                    logger.warning("Workspace item '%s' is a USER_FILE but has empty/whitespace content. Attempting to re-read from source_id.", resolved_item.id)
                     if resolved_item.source_id:
                         try:
                             file_path_obj = Path(resolved_item.source_id).expanduser().resolve()
@@ -116,33 +297,96 @@ async def _resolve_staged_items_for_core(
                             async with aiofiles.open(file_path_obj, "r", encoding="utf-8", errors="ignore") as f:
                                 re_read_content = await f.read()
                             resolved_item.content = re_read_content # Update the content in-place
-                            logger.info(f"Successfully re-read content (len: {len(re_read_content)}) for staged file item '{resolved_item.id}' from path '{resolved_item.source_id}'.")
+                            logger.info("Successfully re-read content (len: %s) for staged file item '%s' from path '%s'.", len(re_read_content), resolved_item.id, resolved_item.source_id)
                         except FileNotFoundError:
-                            logger.error(f"Could not re-read file for item '{resolved_item.id}': path '{resolved_item.source_id}' not found.")
+                            logger.error("Could not re-read file for item '%s': path '%s' not found.", resolved_item.id, resolved_item.source_id)
                         except Exception as e_reread:
-                            logger.error(f"Error re-reading file for item '{resolved_item.id}' from path '{resolved_item.source_id}': {e_reread}")
+                            logger.error("Error re-reading file for item '%s' from path '%s': %s", resolved_item.id, resolved_item.source_id, e_reread)
                 # --- End Rationale Block & Patch ---
 
-                if resolved_item: logger.debug(f"Resolved staged workspace_item: {item_id_ref}")
+                if resolved_item: logger.debug("Resolved staged workspace_item: %s", item_id_ref)
 
             elif item_type_str == "file_content" and item_path:
-                file_path_obj = Path(item_path).expanduser()
-                if file_path_obj.is_file():
-                    file_content_from_path = file_path_obj.read_text(encoding='utf-8', errors='ignore')
-                    resolved_item = LLMCoreContextItem(id=item_spec_id, type=LLMCoreContextItemType.USER_FILE, content=file_content_from_path, source_id=item_path, metadata={"filename": file_path_obj.name, "llmchat_web_staged": True, "ignore_char_limit": no_truncate})
-                    logger.debug(f"Read and created staged file_content item for path: {item_path} (Content length: {len(file_content_from_path)})")
+                file_content_from_path = file_contents_by_index[index]
+                if isinstance(file_content_from_path, BaseException): raise file_content_from_path
+                if file_content_from_path is not None:
+                    resolved_item = _staged_context_item(item_spec_id, LLMCoreContextItemType.USER_FILE, file_content_from_path, item_path, no_truncate, filename=os.path.basename(item_path))
+                    logger.debug("Read and created staged file_content item for path: %s (Content length: %s)", item_path, len(file_content_from_path))
                 else:
-                    logger.warning(f"Staged file_content path does not exist or is not a file: {item_path}")
+                    logger.warning("Staged file_content path does not exist or is not a file: %s", item_path)
             elif item_type_str == "text_content" and item_content is not None:
-                resolved_item = LLMCoreContextItem(id=item_spec_id, type=LLMCoreContextItemType.USER_TEXT, content=item_content, source_id=item_spec_id, metadata={"llmchat_web_staged": True, "ignore_char_limit": no_truncate})
-                logger.debug(f"Created staged text_content item with ID: {item_spec_id}")
-            if resolved_item: explicitly_staged_items.append(resolved_item)
-            else: logger.warning(f"Could not resolve staged item from JS: Type='{item_type_str}', Ref='{item_id_ref}', Path='{item_path}'. Item details: {js_item}")
-        except Exception as e_resolve: logger.error(f"Error resolving staged item {js_item}: {e_resolve}", exc_info=True)
-    logger.info(f"Successfully resolved {len(explicitly_staged_items)} items for LLMCore explicit staging.")
+                if not no_truncate and len(item_content) > MAX_STAGED_TEXT_CHARS:
+                    logger.warning("Staged text_content item %s has %s characters; truncating to %s.", item_spec_id, len(item_content), MAX_STAGED_TEXT_CHARS)
+                    item_content = item_content[:MAX_STAGED_TEXT_CHARS]
+                resolved_item = _staged_context_item(item_spec_id, LLMCoreContextItemType.USER_TEXT, item_content, item_spec_id, no_truncate)
+                logger.debug("Created staged text_content item with ID: %s", item_spec_id)
+            if resolved_item:
+                explicitly_staged_items.append(resolved_item)
+                if item_type_str != "file_content": resolved_by_index[index] = resolved_item
+            else: logger.warning("Could not resolve staged item from JS: Type='%s', Ref='%s', Path='%s'. Item details: %s", item_type_str, item_id_ref, item_path, js_item)
+        except Exception as e_resolve: logger.error("Error resolving staged item %s: %s", js_item, e_resolve, exc_info=True)
+    logger.info("Successfully resolved %s items for LLMCore explicit staging.", len(explicitly_staged_items))
+    if cached_by_index is None:
+        staged_items_cache.set(cache_key, {index: item.model_copy(deep=True) for index, item in resolved_by_index.items()})
     return explicitly_staged_items
 
-async def _stream_chat_responses_route_helper(llm_core_chat_params: Dict[str, Any]) -> AsyncGenerator[str, None]:
+# Opt-in exact-match cache of non-streamed replies to stateless requests (no
+# session_id): identical provider, model, prompt, staged context and RAG settings
+# get the stored reply instead of another provider call. Session-bound chats are
+# never cached, since their history changes with every turn. Disabled while the
+# TTL is 0; messages matching LLMCHAT_WEB_CHAT_CACHE_EXCLUDE (a regex, e.g. for
+# time-sensitive questions) always go to the provider.
+CHAT_CACHE_TTL_SECONDS = float(os.environ.get("LLMCHAT_WEB_CHAT_CACHE_TTL", 0))
+_CHAT_CACHE_EXCLUDE = os.environ.get("LLMCHAT_WEB_CHAT_CACHE_EXCLUDE")
+_CHAT_CACHE_EXCLUDE_RE = re.compile(_CHAT_CACHE_EXCLUDE) if _CHAT_CACHE_EXCLUDE else None
+_chat_response_cache = TTLCache(ttl_seconds=CHAT_CACHE_TTL_SECONDS, maxsize=1024)
+
+def _chat_cache_key(llm_core_params: Dict[str, Any]) -> Optional[str]:
+    """Fingerprint of a cacheable non-stream chat request, or None if it must not be cached."""
+    if CHAT_CACHE_TTL_SECONDS <= 0 or llm_core_params.get("session_id"):
+        return None
+    message = llm_core_params.get("message") or ""
+    if _CHAT_CACHE_EXCLUDE_RE is not None and _CHAT_CACHE_EXCLUDE_RE.search(message):
+        return None
+    keyed_params = dict(llm_core_params)
+    # Staged items and overrides are keyed on what reaches the model, not on their generated ids.
+    for field in ("explicitly_staged_items", "context_override"):
+        if keyed_params.get(field):
+            keyed_params[field] = [
+                (str(getattr(item, "role", None) or getattr(item, "type", None)), item.content)
+                for item in keyed_params[field]
+            ]
+    return request_fingerprint(keyed_params)
+
+# SSE framing around each orjson-encoded payload (compact, UTF-8 bytes).
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+
+def _sse_frame(event: Dict[str, Any]) -> bytes:
+    """Frames an event dict as a Server-Sent Events message, already UTF-8 encoded."""
+    return _SSE_PREFIX + orjson.dumps(event) + _SSE_SUFFIX
+
+# Chunk frames are the hot path: only the content string goes through the JSON
+# encoder, between a fixed prefix and suffix (same bytes as `_sse_frame` builds).
+_CHUNK_FRAME_PREFIX = b'data: {"type":"chunk","content":'
+_CHUNK_FRAME_SUFFIX = b'}\n\n'
+
+# Frames that never vary, encoded once at import.
+_END_FRAME = _sse_frame({'type': 'end'})
+_SERVICE_UNAVAILABLE_FRAME = _sse_frame({'type': 'error', 'error': 'LLM service not available.'})
+_UNEXPECTED_ERROR_FRAME = _sse_frame({'type': 'error', 'error': 'An unexpected server error occurred during chat.'})
+
+# Streamed pieces are coalesced for up to CHAT_COALESCE_SECONDS (0 disables it) or
+# until CHAT_COALESCE_MAX_CHARS characters, so fast models do not produce one
+# frame, write and packet per token.
+CHAT_COALESCE_SECONDS = float(os.environ.get("LLMCHAT_WEB_CHAT_COALESCE_MS", 15)) / 1000
+CHAT_COALESCE_MAX_CHARS = 512
+CHAT_COALESCE_MAX_PIECES = 256
+
+# Upper bound on each post-stream metadata lookup (context details, message ID).
+CHAT_METADATA_TIMEOUT_SECONDS = 2.0
+
+async def _stream_chat_responses_route_helper(llm_core_chat_params: Dict[str, Any]) -> AsyncGenerator[bytes, None]:
     """
     Async generator for streaming chat responses.
     This encapsulates the LLMCore call and SSE formatting, including now
@@ -150,51 +394,123 @@ async def _stream_chat_responses_route_helper(llm_core_chat_params: Dict[str, An
     """
     if not llmcore_instance:
         logger.error("LLMCore instance not available for streaming chat.")
-        yield f"data: {json.dumps({'type': 'error', 'error': 'LLM service not available.'})}\n\n"; yield f"data: {json.dumps({'type': 'end'})}\n\n"; return
+        yield _SERVICE_UNAVAILABLE_FRAME; yield _END_FRAME; return
 
     session_id_for_meta = llm_core_chat_params.get("session_id")
-    logger.debug(f"Starting chat stream for session {session_id_for_meta} with params: {str(llm_core_chat_params.get('message'))[:50]}...")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Starting chat stream for session %s with params: %s...", session_id_for_meta, str(llm_core_chat_params.get('message'))[:50])
     try:
         response_generator = await llmcore_instance.chat(**llm_core_chat_params)
-        async for chunk_content in response_generator:
-            yield f"data: {json.dumps({'type': 'chunk', 'content': chunk_content})}\n\n"
-            await asyncio.sleep(0.01)
-
-        logger.debug(f"Chat stream completed for session {session_id_for_meta}. Fetching post-stream metadata.")
+        if CHAT_COALESCE_SECONDS > 0:
+            # Pieces arriving within the window are joined into one chunk frame;
+            # the client appends chunk content, so the rendered text is unchanged.
+            async for pieces in batched(
+                response_generator, CHAT_COALESCE_SECONDS, CHAT_COALESCE_MAX_PIECES, max_weight=CHAT_COALESCE_MAX_CHARS
+            ):
+                yield _CHUNK_FRAME_PREFIX + orjson.dumps("".join(pieces)) + _CHUNK_FRAME_SUFFIX
+        else:
+            async for chunk_content in response_generator:
+                yield _CHUNK_FRAME_PREFIX + orjson.dumps(chunk_content) + _CHUNK_FRAME_SUFFIX
+
+        logger.debug("Chat stream completed for session %s. Fetching post-stream metadata.", session_id_for_meta)
 
         if session_id_for_meta:
-            # New: Fetch RAG results from LLMCore's transient cache
-            context_details = await llmcore_instance.get_last_interaction_context_info(session_id_for_meta)
+            # The last interaction's context details (RAG results and context usage)
+            # and the reply's message ID are independent lookups; fetch them
+            # concurrently. Each is given up after CHAT_METADATA_TIMEOUT_SECONDS so a
+            # slow session store cannot hold back the end frame; a timed-out lookup
+            # is skipped like a failed one.
+            context_details, last_assistant_message_id = await asyncio.gather(
+                asyncio.wait_for(llmcore_instance.get_last_interaction_context_info(session_id_for_meta), CHAT_METADATA_TIMEOUT_SECONDS),
+                asyncio.wait_for(_streamed_assistant_message_id(response_generator, session_id_for_meta), CHAT_METADATA_TIMEOUT_SECONDS),
+                return_exceptions=True
+            )
+            if isinstance(context_details, BaseException):
+                logger.error("Error fetching last interaction context for session %s: %r", session_id_for_meta, context_details)
+                context_details = None
+            if isinstance(last_assistant_message_id, BaseException):
+                logger.error("Error fetching last assistant message ID for session %s: %r", session_id_for_meta, last_assistant_message_id)
+                last_assistant_message_id = None
+            context_usage_data = context_usage_from_details(context_details)
+
+            # RAG results come from LLMCore's transient cache of the last interaction
             if context_details and context_details.rag_documents_used:
                 rag_docs_payload = [doc.model_dump(mode="json") for doc in context_details.rag_documents_used]
-                yield f"data: {json.dumps({'type': 'rag_results', 'documents': rag_docs_payload})}\n\n"
-                logger.info(f"Yielded {len(rag_docs_payload)} RAG results for session {session_id_for_meta}.")
-
-            # Existing logic for other metadata
-            last_assistant_message_id = await _get_last_assistant_message_id(session_id_for_meta)
-            context_usage_data = await get_context_usage_info(session_id_for_meta)
+                yield _sse_frame({'type': 'rag_results', 'documents': rag_docs_payload})
+                logger.info("Yielded %s RAG results for session %s.", len(rag_docs_payload), session_id_for_meta)
 
             if last_assistant_message_id:
-                logger.debug(f"Yielding full_response_id: {last_assistant_message_id} for session {session_id_for_meta}")
-                yield f"data: {json.dumps({'type': 'full_response_id', 'message_id': last_assistant_message_id})}\n\n"
+                logger.debug("Yielding full_response_id: %s for session %s", last_assistant_message_id, session_id_for_meta)
+                yield _sse_frame({'type': 'full_response_id', 'message_id': last_assistant_message_id})
 
             if context_usage_data:
-                logger.debug(f"Yielding context_usage data for session {session_id_for_meta}: {context_usage_data}")
-                yield f"data: {json.dumps({'type': 'context_usage', 'data': context_usage_data})}\n\n"
+                logger.debug("Yielding context_usage data for session %s: %s", session_id_for_meta, context_usage_data)
+                yield _sse_frame({'type': 'context_usage', 'data': context_usage_data})
 
     except (ProviderError, ContextLengthError, SessionNotFoundError, LLMCoreError) as e:
-        logger.error(f"LLMCore chat error during stream for session {session_id_for_meta}: {e}", exc_info=True)
-        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        logger.error("LLMCore chat error during stream for session %s: %s", session_id_for_meta, e, exc_info=True)
+        yield _sse_frame({'type': 'error', 'error': str(e)})
     except Exception as e:
-        logger.error(f"Unexpected error during chat stream for session {session_id_for_meta}: {e}", exc_info=True)
-        yield f"data: {json.dumps({'type': 'error', 'error': 'An unexpected server error occurred during chat.'})}\n\n"
+        logger.error("Unexpected error during chat stream for session %s: %s", session_id_for_meta, e, exc_info=True)
+        yield _UNEXPECTED_ERROR_FRAME
+    finally:
+        logger.info("Ending chat stream for session %s.", session_id_for_meta)
+        invalidate_session_caches(session_id_for_meta)
+        yield _END_FRAME
+
+
+# Non-stream replies up to this many characters are buffered and answered with one
+# JSON body (cacheable, with a proper error status); longer ones are written out
+# while the model is still generating (see `_stream_json_reply_helper`).
+NON_STREAM_BUFFER_MAX_CHARS = 64 * 1024
+
+async def _stream_json_reply_helper(
+    response_generator: Any, buffered_pieces: List[str], session_id: Optional[str]
+) -> AsyncGenerator[bytes, None]:
+    """
+    Writes a long non-stream chat reply as the usual JSON object while it is still
+    being generated: the "content" string is emitted piece by piece, each piece
+    escaped on its own, and message_id/context_usage close the object once the
+    reply is complete.
+
+    The 200 status is sent with the first bytes, so an error mid-reply cannot turn
+    into a 500: the object is still closed as valid JSON, with an "error" member
+    next to the partial content and null message_id/context_usage.
+    """
+    yield b'{"role":"assistant","content":"'
+    yield orjson.dumps("".join(buffered_pieces))[1:-1]
+    error_message: Optional[str] = None
+    try:
+        async for piece in response_generator:
+            yield orjson.dumps(piece)[1:-1]
+    except (ProviderError, ContextLengthError, SessionNotFoundError, LLMCoreError) as e:
+        logger.error("LLMCore chat error (non-stream, streamed body) for session %s: %s", session_id, e, exc_info=True)
+        error_message = str(e)
+    except Exception as e_unexp:
+        logger.error("Unexpected error during non-stream chat (streamed body) for session %s: %s", session_id, e_unexp, exc_info=True)
+        error_message = "An unexpected server error occurred during chat."
     finally:
-        logger.info(f"Ending chat stream for session {session_id_for_meta}.")
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        # Also reached when the client disconnects and this generator is closed early.
+        aclose = getattr(response_generator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    invalidate_session_caches(session_id)
+    tail: Dict[str, Any] = {"message_id": None, "context_usage": None}
+    if error_message is None:
+        tail["message_id"], tail["context_usage"] = await asyncio.gather(
+            _streamed_assistant_message_id(response_generator, session_id),
+            get_context_usage_info(session_id)
+        )
+        logger.info("Non-stream chat response for session %s successful. Message ID: %s", session_id, tail["message_id"])
+    else:
+        tail["error"] = error_message
+    # Closes the content string, then continues the object with the tail's members.
+    yield b'",' + orjson.dumps(tail)[1:]
 
 
 @chat_bp.route("", methods=["POST"])
-def api_chat_route() -> Any:
+@async_to_sync_in_flask
+async def api_chat_route() -> Any:
     """
     Handles chat messages from the user, supporting both LLMCore-managed context
     and a direct UI-managed context override.
@@ -207,51 +523,62 @@ def api_chat_route() -> Any:
     JSON Payload:
         message (str): The user's message from the main chat input box.
         session_id (Optional[str]): The active session ID.
-        stream (bool): Whether to stream the response (default: True).
+        stream (bool): Whether to stream the response as SSE (default: True). With
+            false, the reply is one JSON object; replies longer than
+            NON_STREAM_BUFFER_MAX_CHARS have that object's body sent as it is generated.
+            Such a reply has already been answered with 200 when generation fails
+            partway, so the failure is reported as an "error" member of the object
+            (next to the partial "content"); clients must check for it, not only
+            for the status code. Shorter replies fail with a 500 as before.
         raw_prompt_workbench_content (Optional[str]): If provided, its content is
             used to override LLMCore's context assembly.
         active_context_specification (Optional[List[Dict]]): Used in LLMCore-managed mode.
         message_inclusion_map (Optional[Dict[str, bool]]): Used in LLMCore-managed mode.
     """
-    if not llmcore_instance: logger.error("/api/chat called but LLM service (llmcore_instance) is not available."); return jsonify({"error": "LLM service not available."}), 503
-    data = request.json
-    if not data or "message" not in data: logger.warning("/api/chat called without 'message' in JSON payload."); return jsonify({"error": "No message provided."}), 400
+    # Validated in one pass; a missing or malformed message is answered with a 400.
+    req = parse_json_body(ChatRequest)
+
+    user_message_content: str = req.message
+    session_id_from_request: Optional[str] = req.session_id if "session_id" in req.model_fields_set else get_current_web_session_id()
+    stream_requested: bool = req.stream
+    raw_prompt_workbench_content: Optional[str] = req.raw_prompt_workbench_content
+    message_inclusion_map: Optional[Dict[str, bool]] = req.message_inclusion_map
+    active_context_spec_from_js: List[StagedItemSpec] = req.active_context_specification or []
 
-    user_message_content: str = data["message"]
-    session_id_from_request: Optional[str] = data.get("session_id", get_current_web_session_id())
-    stream_requested: bool = data.get("stream", True)
-    raw_prompt_workbench_content: Optional[str] = data.get("raw_prompt_workbench_content")
+    # Resolve the session proxy once; every flask_session access otherwise goes
+    # through LocalProxy and the request context lookup.
+    session_settings = flask_session._get_current_object()
 
     if logger.isEnabledFor(logging.DEBUG):
         session_details_for_chat_route = {
-            "current_llm_session_id_in_flask": flask_session.get('current_llm_session_id'),
-            "current_provider_name_in_flask": flask_session.get('current_provider_name'),
-            "current_model_name_in_flask": flask_session.get('current_model_name'),
-            "flask_session_full_content_keys": list(flask_session.keys())
+            "current_llm_session_id_in_flask": session_settings.get('current_llm_session_id'),
+            "current_provider_name_in_flask": session_settings.get('current_provider_name'),
+            "current_model_name_in_flask": session_settings.get('current_model_name'),
+            "flask_session_full_content_keys": list(session_settings.keys())
         }
-        logger.debug(f"FLASK_SESSION_STATE_SUMMARY (Inside /api/chat for session_id_from_request: {session_id_from_request}): {session_details_for_chat_route}")
+        logger.debug("FLASK_SESSION_STATE_SUMMARY (Inside /api/chat for session_id_from_request: %s): %s", session_id_from_request, session_details_for_chat_route)
 
-    provider_name = flask_session.get('current_provider_name')
-    model_name = flask_session.get('current_model_name')
+    provider_name = session_settings.get('current_provider_name')
+    model_name = session_settings.get('current_model_name')
 
     if provider_name is None and llmcore_instance and llmcore_instance.config:
-        default_provider = llmcore_instance.config.get("llmcore.default_provider")
+        default_provider = get_default_provider_name()
         if default_provider:
-            logger.warning(f"Chat route: 'current_provider_name' was None in Flask session for request to '{request.path}'. Initializing from LLMCore default: {default_provider}.")
-            provider_name = default_provider; flask_session['current_provider_name'] = provider_name
-            default_model = llmcore_instance.config.get(f"providers.{provider_name}.default_model")
+            logger.warning("Chat route: 'current_provider_name' was None in Flask session for request to '%s'. Initializing from LLMCore default: %s.", request.path, default_provider)
+            provider_name = default_provider; session_settings['current_provider_name'] = provider_name
+            default_model = get_default_model_name(provider_name)
             if default_model:
-                logger.info(f"Chat route: Setting model to provider '{provider_name}' default: {default_model} as current_model_name was also likely None or inconsistent."); model_name = default_model; flask_session['current_model_name'] = model_name
-            elif model_name is None : logger.warning(f"Chat route: 'current_model_name' is None for provider '{provider_name}', and no default model found in config.")
+                logger.info("Chat route: Setting model to provider '%s' default: %s as current_model_name was also likely None or inconsistent.", provider_name, default_model); model_name = default_model; session_settings['current_model_name'] = model_name
+            elif model_name is None : logger.warning("Chat route: 'current_model_name' is None for provider '%s', and no default model found in config.", provider_name)
         else: logger.error("Chat route: 'current_provider_name' is None and no LLMCore default provider is configured.")
     elif model_name is None and provider_name and llmcore_instance and llmcore_instance.config:
-        default_model = llmcore_instance.config.get(f"providers.{provider_name}.default_model")
+        default_model = get_default_model_name(provider_name)
         if default_model:
-            logger.warning(f"Chat route: 'current_model_name' was None in Flask session for provider '{provider_name}' for request to '{request.path}'. Initializing from provider's default model: {default_model}.")
-            model_name = default_model; flask_session['current_model_name'] = model_name
-        else: logger.warning(f"Chat route: 'current_model_name' is None for provider '{provider_name}', and no default model found in config.")
+            logger.warning("Chat route: 'current_model_name' was None in Flask session for provider '%s' for request to '%s'. Initializing from provider's default model: %s.", provider_name, request.path, default_model)
+            model_name = default_model; session_settings['current_model_name'] = model_name
+        else: logger.warning("Chat route: 'current_model_name' is None for provider '%s', and no default model found in config.", provider_name)
 
-    flask_session.modified = True
+    session_settings.modified = True
 
     llm_core_params: Dict[str, Any]
 
@@ -271,7 +598,7 @@ def api_chat_route() -> Any:
         #                recorded in the session history.
         # Post-state: The route now supports a UI-managed context mode, enabling expert-level
         #             prompt engineering from the web interface.
-        logger.info(f"Chat request for session '{session_id_from_request}' in UI_MANAGED mode.")
+        logger.info("Chat request for session '%s' in UI_MANAGED mode.", session_id_from_request)
 
         context_override_payload = [
             LLMCoreMessage(
@@ -292,48 +619,81 @@ def api_chat_route() -> Any:
         }
     else:
         # LLMCORE_MANAGED mode (existing logic)
-        logger.info(f"Chat request for session '{session_id_from_request}' in LLMCORE_MANAGED mode.")
-        message_inclusion_map: Optional[Dict[str, bool]] = data.get('message_inclusion_map', None)
-        active_context_spec_from_js: List[Dict[str, Any]] = data.get('active_context_specification', [])
-        try:
-            explicitly_staged_items = async_to_sync_in_flask(_resolve_staged_items_for_core)(active_context_spec_from_js, session_id_from_request)
-        except Exception as e_resolve_ctx:
-            logger.error(f"Error resolving context items for chat session {session_id_from_request}: {e_resolve_ctx}", exc_info=True)
-            return jsonify({"error": f"Failed to process context items: {str(e_resolve_ctx)}"}), 500
+        logger.info("Chat request for session '%s' in LLMCORE_MANAGED mode.", session_id_from_request)
+        explicitly_staged_items: List[Union[LLMCoreMessage, LLMCoreContextItem]] = []
+        if active_context_spec_from_js: # Most turns stage nothing; skip resolution entirely then
+            try:
+                explicitly_staged_items = await _resolve_staged_items_for_core(active_context_spec_from_js, session_id_from_request)
+            except Exception as e_resolve_ctx:
+                logger.error("Error resolving context items for chat session %s: %s", session_id_from_request, e_resolve_ctx, exc_info=True)
+                return jsonify({"error": f"Failed to process context items: {str(e_resolve_ctx)}"}), 500
 
         llm_core_params = {
             "message": user_message_content, "session_id": session_id_from_request,
             "provider_name": provider_name, "model_name": model_name,
-            "system_message": flask_session.get('system_message'), "save_session": True,
-            "enable_rag": flask_session.get('rag_enabled', False),
-            "rag_collection_name": flask_session.get('rag_collection_name'),
-            "rag_retrieval_k": flask_session.get('rag_k_value'),
-            "rag_metadata_filter": flask_session.get('rag_filter'),
-            "prompt_template_values": flask_session.get('prompt_template_values', {}),
+            "system_message": session_settings.get('system_message'), "save_session": True,
+            "enable_rag": session_settings.get('rag_enabled', False),
+            "rag_collection_name": session_settings.get('rag_collection_name'),
+            "rag_retrieval_k": session_settings.get('rag_k_value'),
+            "rag_metadata_filter": session_settings.get('rag_filter'),
+            "prompt_template_values": session_settings.get('prompt_template_values', {}),
             "explicitly_staged_items": explicitly_staged_items,
             "stream": stream_requested,
             "message_inclusion_map": message_inclusion_map,
         }
 
-    logger.info(
-        f"Dispatching to LLMCore.chat. Message: '{llm_core_params.get('message', '')[:50]}...'. "
-        f"Provider: {provider_name}, Model: {model_name}. "
-        f"UI_Managed: {raw_prompt_workbench_content is not None}. Stream: {stream_requested}."
-    )
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Dispatching to LLMCore.chat. Message: '%s...'. Provider: %s, Model: %s. UI_Managed: %s. Stream: %s.",
+            user_message_content[:50], provider_name, model_name, raw_prompt_workbench_content is not None, stream_requested
+        )
 
     if stream_requested:
         llm_core_params["stream"] = True
         sync_generator = run_async_generator_synchronously(_stream_chat_responses_route_helper, llm_core_params)
-        return Response(stream_with_context(sync_generator), content_type="text/event-stream")
+        return sse_response(sync_generator)
     else:
         llm_core_params["stream"] = False
+        chat_cache_key = _chat_cache_key(llm_core_params)
+        if chat_cache_key is not None:
+            cached_body = _chat_response_cache.get(chat_cache_key)
+            if cached_body is not None:
+                logger.info("Serving stateless non-stream chat reply from the response cache.")
+                return json_response(cached_body)
         try:
-            response_content_str: str = async_to_sync_in_flask(llmcore_instance.chat)(**llm_core_params)
-            last_msg_id = async_to_sync_in_flask(_get_last_assistant_message_id)(session_id_from_request)
-            ctx_usage = async_to_sync_in_flask(get_context_usage_info)(session_id_from_request)
-            logger.info(f"Non-stream chat response for session {session_id_from_request} successful. Message ID: {last_msg_id}")
-            return jsonify({"role": "assistant", "content": response_content_str, "message_id": last_msg_id, "context_usage": ctx_usage})
-        except (ProviderError, ContextLengthError, SessionNotFoundError, LLMCoreError) as e: logger.error(f"LLMCore chat error (non-stream) for session {session_id_from_request}: {e}", exc_info=True); return jsonify({"error": str(e)}), 500
-        except Exception as e_unexp: logger.error(f"Unexpected error during non-stream chat for session {session_id_from_request}: {e_unexp}", exc_info=True); return jsonify({"error": "An unexpected server error occurred during chat."}), 500
+            # The reply is requested as a stream and buffered; once it outgrows
+            # NON_STREAM_BUFFER_MAX_CHARS the JSON body is sent while the rest is generated.
+            llm_core_params["stream"] = True
+            response_generator = await llmcore_instance.chat(**llm_core_params)
+            handed_off = False
+            try:
+                response_pieces: List[str] = []
+                buffered_chars = 0
+                async for piece in response_generator:
+                    response_pieces.append(piece)
+                    buffered_chars += len(piece)
+                    if buffered_chars > NON_STREAM_BUFFER_MAX_CHARS:
+                        logger.info("Non-stream chat reply for session %s exceeds %s characters; streaming the JSON body.", session_id_from_request, NON_STREAM_BUFFER_MAX_CHARS)
+                        handed_off = True # `_stream_json_reply_helper` now owns (and closes) the generator
+                        return json_stream_response(run_async_generator_synchronously(
+                            _stream_json_reply_helper, response_generator, response_pieces, session_id_from_request
+                        ))
+                response_content_str = "".join(response_pieces)
+                invalidate_session_caches(session_id_from_request)
+                last_msg_id, ctx_usage = await asyncio.gather(
+                    _streamed_assistant_message_id(response_generator, session_id_from_request),
+                    get_context_usage_info(session_id_from_request)
+                )
+            finally:
+                aclose = getattr(response_generator, "aclose", None)
+                if not handed_off and aclose is not None:
+                    await aclose()
+            logger.info("Non-stream chat response for session %s successful. Message ID: %s", session_id_from_request, last_msg_id)
+            body = orjson.dumps({"role": "assistant", "content": response_content_str, "message_id": last_msg_id, "context_usage": ctx_usage})
+            if chat_cache_key is not None:
+                _chat_response_cache.set(chat_cache_key, body)
+            return json_response(body)
+        except (ProviderError, ContextLengthError, SessionNotFoundError, LLMCoreError) as e: logger.error("LLMCore chat error (non-stream) for session %s: %s", session_id_from_request, e, exc_info=True); return jsonify({"error": str(e)}), 500
+        except Exception as e_unexp: logger.error("Unexpected error during non-stream chat for session %s: %s", session_id_from_request, e_unexp, exc_info=True); return jsonify({"error": "An unexpected server error occurred during chat."}), 500
 
 logger.info("Chat routes (/api/chat) defined on chat_bp.")
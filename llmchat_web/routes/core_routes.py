@@ -22,9 +22,12 @@ from ..app import (
     llmcore_instance,
     llmcore_init_error, # The global init error from app.py
     async_to_sync_in_flask,
+    llmcore_optional,
     get_context_usage_info, # Import the helper function
     get_current_web_session_id,
     set_current_web_session_id,
+    get_default_model_name,
+    get_default_provider_name,
     logger as app_logger, # Main app logger, can be used as parent
     APP_VERSION
 )
@@ -85,13 +88,8 @@ def index() -> str:
         logger.debug("Flask session 'rag_filter' initialized to None.")
 
     # Initialize LLM settings in session if not present
-    default_provider_from_core = None
-    default_model_from_core = None
-    if llmcore_instance and llmcore_instance.config:
-        default_provider_from_core = llmcore_instance.config.get("llmcore.default_provider")
-        if default_provider_from_core:
-            provider_conf_key = f"providers.{default_provider_from_core}"
-            default_model_from_core = llmcore_instance.config.get(f"{provider_conf_key}.default_model")
+    default_provider_from_core = get_default_provider_name()
+    default_model_from_core = get_default_model_name(default_provider_from_core)
 
     if 'current_provider_name' not in flask_session:
         flask_session['current_provider_name'] = default_provider_from_core
@@ -117,6 +115,7 @@ def index() -> str:
 
 
 @core_bp.route("/api/status", methods=["GET"])
+@llmcore_optional
 @async_to_sync_in_flask
 async def api_status() -> Any:
     """
@@ -136,10 +135,8 @@ async def api_status() -> Any:
         llmcore_status_val = "initializing"
         llmcore_error_detail_val = "LLMCore instance is None (still initializing or failed silently)."
     elif llmcore_instance and llmcore_instance.config:
-        llmcore_default_provider_val = llmcore_instance.config.get("llmcore.default_provider")
-        if llmcore_default_provider_val:
-            provider_conf_key = f"providers.{llmcore_default_provider_val}"
-            llmcore_default_model_val = llmcore_instance.config.get(f"{provider_conf_key}.default_model")
+        llmcore_default_provider_val = get_default_provider_name()
+        llmcore_default_model_val = get_default_model_name(llmcore_default_provider_val)
     else:
         llmcore_status_val = "error"
         llmcore_error_detail_val = "LLMCore instance exists but its config is unavailable."
@@ -149,7 +146,7 @@ async def api_status() -> Any:
 
     if current_provider_val and current_model_val is None:
         if llmcore_instance and llmcore_instance.config:
-            provider_specific_default_model = llmcore_instance.config.get(f"providers.{current_provider_val}.default_model")
+            provider_specific_default_model = get_default_model_name(current_provider_val)
             if provider_specific_default_model:
                 current_model_val = provider_specific_default_model
                 logger.debug(f"API Status: Model was None for provider '{current_provider_val}', set to provider's default: '{current_model_val}'.")
@@ -187,6 +184,7 @@ async def api_status() -> Any:
 
 
 @core_bp.route("/api/command", methods=["POST"])
+@llmcore_optional
 @async_to_sync_in_flask
 async def api_command_route() -> Any:
     """
@@ -210,6 +208,7 @@ async def api_command_route() -> Any:
     })
 
 @core_bp.route("/api/logs", methods=["GET"])
+@llmcore_optional
 def api_logs_route() -> Any:
     """
     API endpoint to fetch recent application logs.
@@ -280,10 +279,6 @@ async def estimate_tokens_route() -> Any:
         "model_name": "Optional: The specific model for context."
     }
     """
-    if not llmcore_instance:
-        logger.error("Attempted to estimate tokens, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
     data = request.json
     if not data or "text" not in data or "provider_name" not in data:
         logger.warning("Token estimation API called without 'text' or 'provider_name' fields.")
@@ -5,19 +5,31 @@ Handles ingestion of files, directories (via ZIP), and Git repositories
 into RAG collections using Apykatu and LLMCore.
 """
 import asyncio
-import json
+import concurrent.futures
+import contextlib
+import dataclasses
+import inspect
 import logging
+import os
+import ntpath
+import re
 import tempfile
-import shutil # For removing temporary directories if needed, though TemporaryDirectory handles it
+import threading
+import time
+import shutil
+import uuid
 import zipfile
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict, List, Optional
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from flask import Response, request, stream_with_context
+import orjson
+from flask import Response, request
 from werkzeug.utils import secure_filename
 
 # Import the specific blueprint defined in the routes package's __init__.py
 from . import ingest_bp
+from .utils import NDJSON_MIMETYPE, batched, listing_cache, ndjson_stream_response, preview_cache, sse_response
 
 # Import shared components from the main app module (llmchat_web.app)
 from ..app import (
@@ -26,16 +38,14 @@ from ..app import (
     logger as app_logger # Main app logger
 )
 
-# Attempt to import Apykatu and GitPython for ingestion
+# Attempt to import Apykatu for ingestion
 APYKATU_AVAILABLE = False
-GITPYTHON_AVAILABLE = False
 ApykatuAppConfig = None
 IngestionPipeline = None
 apykatu_process_file_path_api = None
 ApykatuConfigError = None
 ApykatuProcessedChunk = None # type: ignore
 ApykatuProcessingStats = None # type: ignore
-git = None # type: ignore
 
 try:
     from apykatu.pipelines.ingest import IngestionPipeline as ApykatuIngestionPipeline
@@ -54,14 +64,10 @@ try:
 except ImportError:
     # Logging will be done by the logger instance below
     pass # Handled by logger message
-
-try:
-    import git as pygit
-    GITPYTHON_AVAILABLE = True
-    git = pygit
-except ImportError:
-    # Logging will be done by the logger instance below
-    pass # Handled by logger message
+# Git repositories are cloned with the git CLI, which must be on PATH.
+GIT_EXECUTABLE = shutil.which("git")
+# Partial clones (--filter=blob:none) are on by default; set GIT_PARTIAL_CLONE=0 to disable.
+GIT_PARTIAL_CLONE = os.environ.get("GIT_PARTIAL_CLONE", "1").strip().lower() not in ("0", "false", "no", "off")
 
 
 # Configure a local logger for this specific routes module
@@ -89,16 +95,265 @@ if not APYKATU_AVAILABLE:
     if ApykatuProcessingStats is None: ApykatuProcessingStats = type('ApykatuProcessingStats', (object,), {}) # type: ignore
 
 
-if not GITPYTHON_AVAILABLE:
-    logger.warning("GitPython library not found. Git ingestion will be disabled.")
-    if git is None: git = type('git', (object,), {}) # type: ignore
+if not GIT_EXECUTABLE:
+    logger.warning("git executable not found on PATH. Git ingestion will be disabled.")
+
+
+# Number of embedded chunks accumulated across uploaded files before they are
+# written to the vector store in a single add_documents_to_vector_store call.
+INGEST_BATCH_CHUNKS = 512
+
+# At most this many per-file error messages are kept for the final summary; the
+# rest are only counted, so a batch of failing files cannot bloat the last frame.
+INGEST_MAX_SUMMARY_ERRORS = 500
+
+# Each ingestion request works in its own uuid-named directory under a shared,
+# pre-created root instead of a fresh mkdtemp() in the system temp directory.
+# Directories are removed on a background thread once their stream ends, and
+# ones left behind by a crashed process are swept when this module is loaded.
+INGEST_ROOT = Path(os.environ.get("LLMCHAT_WEB_INGEST_ROOT") or Path(tempfile.gettempdir()) / "llmchat_web_ingest")
+INGEST_WORKDIR_MAX_AGE_SECONDS = 6 * 60 * 60
+_CLEANUP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="llmchat_web_ingest_cleanup")
+
+
+def _sweep_stale_ingest_workdirs() -> None:
+    """Removes working directories under INGEST_ROOT older than INGEST_WORKDIR_MAX_AGE_SECONDS."""
+    cutoff = time.time() - INGEST_WORKDIR_MAX_AGE_SECONDS
+    try:
+        entries = list(INGEST_ROOT.iterdir())
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            continue
+
+
+@contextlib.contextmanager
+def _ingest_workdir(label: str) -> Iterator[Path]:
+    """Creates a working directory for one ingestion request and schedules its removal on exit."""
+    workdir = INGEST_ROOT / f"{label}_{uuid.uuid4().hex}"
+    workdir.mkdir(parents=True)
+    try:
+        yield workdir
+    finally:
+        _CLEANUP_EXECUTOR.submit(shutil.rmtree, workdir, ignore_errors=True)
+
+
+try:
+    INGEST_ROOT.mkdir(parents=True, exist_ok=True)
+    _CLEANUP_EXECUTOR.submit(_sweep_stale_ingest_workdirs)
+except OSError as e_root:
+    logger.error("Could not create ingestion working root '%s': %s", INGEST_ROOT, e_root)
 
 
 # --- Ingestion Helper Functions ---
 
+@dataclasses.dataclass(slots=True)
+class IngestSummary:
+    """
+    Summary sent with the final `ingestion_complete` event. orjson serializes
+    dataclasses natively, so it is passed to the framers as is. Counts are strings
+    such as "N/A (dir)" for pipeline-based ingestion, which does not report them.
+    """
+    status: str
+    collection_name: str
+    total_files_submitted: Union[int, str]
+    files_processed_successfully: Union[int, str]
+    files_with_errors: Union[int, str]
+    total_chunks_added_to_db: Union[int, str]
+    error_messages: List[str] = dataclasses.field(default_factory=list)
+    message: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+
+
+# The ingestion generators yield plain event dicts carrying a 'type' key; the
+# route frames them either as SSE (the default, used by the browser UI) or as
+# JSONL for programmatic clients (see `_event_stream_response`).
+_END_EVENT: Dict[str, Any] = {'type': 'end'}
+
+# SSE framing around each JSON payload, kept as bytes so frames are built by
+# plain concatenation with orjson's output.
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    """Frames an event dict as a Server-Sent Events message, already UTF-8 encoded."""
+    return _SSE_PREFIX + orjson.dumps(event) + _SSE_SUFFIX
+
+
+def _jsonl(event: Dict[str, Any]) -> bytes:
+    """
+    Frames an event dict as one JSON line keyed by its type, so
+    `{"type": "file_end", ...}` becomes `{"file_end": {...}}`.
+    """
+    payload = {key: value for key, value in event.items() if key != 'type'}
+    return orjson.dumps({event['type']: payload}) + b"\n"
+
+
+# The end frame closes every stream; build it once per format.
+_SSE_END = _sse(_END_EVENT)
+_JSONL_END = _jsonl(_END_EVENT)
+
+# Small-file ingests emit events faster than it is worth flushing them one by one.
+# Events are coalesced for up to INGEST_COALESCE_SECONDS or INGEST_COALESCE_MAX_EVENTS
+# and written as a single frame; terminal events are never held back.
+INGEST_COALESCE_SECONDS = 0.025
+INGEST_COALESCE_MAX_EVENTS = 32
+_UNBATCHED_EVENT_TYPES = frozenset({'ingestion_complete', 'error', 'end'})
+
+
+def _is_unbatched_event(event: Dict[str, Any]) -> bool:
+    return event['type'] in _UNBATCHED_EVENT_TYPES
+
+
+def _coalesced_ingest_events(stream_func: Callable[..., AsyncIterator[Dict[str, Any]]], *args: Any) -> AsyncGenerator[List[Dict[str, Any]], None]:
+    """Runs an ingestion generator and regroups its events into batches (see `batched`)."""
+    return batched(stream_func(*args), INGEST_COALESCE_SECONDS, INGEST_COALESCE_MAX_EVENTS, flush_on=_is_unbatched_event)
+
+
+def _sse_frames(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    # A lone event keeps the plain object frame; a batch becomes one `data: [...]` frame.
+    for batch in batches:
+        if len(batch) == 1:
+            event = batch[0]
+            yield _SSE_END if event is _END_EVENT else _sse(event)
+        else:
+            yield _SSE_PREFIX + orjson.dumps(batch) + _SSE_SUFFIX
+
+
+def _jsonl_frames(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    # JSONL keeps one event per line; a batch is only written as one chunk.
+    for batch in batches:
+        yield b"".join(_JSONL_END if event is _END_EVENT else _jsonl(event) for event in batch)
+
+
+def _wants_jsonl() -> bool:
+    return request.args.get('format') == 'jsonl'
+
+
+def _error_response(message: str, status: int = 400) -> Response:
+    """
+    Answers a request rejected before ingestion starts with its whole event stream,
+    an `error` event followed by `end`, as one prebuilt body rather than a generator.
+    """
+    event = {'type': 'error', 'error': message}
+    if _wants_jsonl():
+        return Response(_jsonl(event) + _JSONL_END, status=status, mimetype=NDJSON_MIMETYPE)
+    return Response(_sse(event) + _SSE_END, status=status, mimetype="text/event-stream")
+
+
+def _event_stream_response(batches: Iterable[List[Dict[str, Any]]], status: int = 200) -> Response:
+    """
+    Streams batches of ingestion events as SSE, or as JSONL when the request has
+    `?format=jsonl`. Must be called inside the request context, since it inspects
+    the query string.
+    """
+    if _wants_jsonl():
+        return ndjson_stream_response(_jsonl_frames(batches), status=status)
+    return sse_response(_sse_frames(batches), status=status)
+
+
+# Prepared ApykatuAppConfig objects, keyed by target collection name. The cache is
+# tied to the identity of the LLMCore config object it was built from, so a
+# reloaded LLMCore config starts from an empty cache.
+_APYKATU_CFG_CACHE: Dict[str, Any] = {}
+_APYKATU_CFG_CACHE_SOURCE: Optional[int] = None
+_APYKATU_CFG_CACHE_LOCK = threading.Lock()
+
+# Resolved vector store paths, keyed by the raw configured string. Resolving
+# follows symlinks on disk, and the configured path rarely changes.
+_RESOLVED_PATHS: Dict[str, Path] = {}
+
+# Idle Apykatu IngestionPipelines reused across dir_zip/git requests, so embedding
+# models and DB clients are not rebuilt for every ingestion. Pipelines are matched
+# on the prepared config alone: the threaded server runs each request on a fresh
+# thread (and thus a fresh event loop), so keying on the loop would never hit. A
+# request checks a pipeline out for its whole run and returns it afterwards, so
+# one pipeline never serves two requests at once. Entries hold their config, so
+# the config's identity stays unique while they are cached. Keyed by id(pipeline),
+# least recently returned first; pipelines dropped from the cache are closed.
+INGEST_PIPELINE_CACHE_SIZE = 8
+_PIPELINE_CACHE: "OrderedDict[int, Tuple[Any, Any]]" = OrderedDict()
+# Closes started from synchronous code while a loop is running, kept referenced until done.
+_PENDING_PIPELINE_CLOSES: "set[asyncio.Task[None]]" = set()
+
+
+def clear_apykatu_config_cache() -> None:
+    """Drops all memoized Apykatu ingestion configs and closes the idle pipelines (e.g. after a config reload)."""
+    global _APYKATU_CFG_CACHE_SOURCE
+    with _APYKATU_CFG_CACHE_LOCK:
+        _APYKATU_CFG_CACHE.clear()
+        _APYKATU_CFG_CACHE_SOURCE = None
+        _RESOLVED_PATHS.clear()
+        idle_pipelines = [pipeline for _, pipeline in _PIPELINE_CACHE.values()]
+        _PIPELINE_CACHE.clear()
+    if not idle_pipelines:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(_close_pipelines(idle_pipelines))
+    else:
+        task = loop.create_task(_close_pipelines(idle_pipelines))
+        _PENDING_PIPELINE_CLOSES.add(task)
+        task.add_done_callback(_PENDING_PIPELINE_CLOSES.discard)
+
+
+async def _close_pipelines(pipelines: List[Any]) -> None:
+    """Closes pipelines dropped from the cache, if they expose close()/aclose() (sync or async)."""
+    for pipeline in pipelines:
+        close = getattr(pipeline, "aclose", None) or getattr(pipeline, "close", None)
+        if close is None:
+            continue
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e_close:
+            logger.warning("Error closing evicted Apykatu ingestion pipeline: %s", e_close)
+
+
+def _acquire_ingestion_pipeline(apykatu_cfg: Any) -> Any:
+    """Checks out an idle IngestionPipeline built for `apykatu_cfg`, building one if none is idle."""
+    with _APYKATU_CFG_CACHE_LOCK:
+        for pipeline_key in reversed(_PIPELINE_CACHE):
+            cached_cfg, pipeline = _PIPELINE_CACHE[pipeline_key]
+            if cached_cfg is apykatu_cfg:
+                del _PIPELINE_CACHE[pipeline_key]
+                logger.debug("Reusing cached Apykatu ingestion pipeline.")
+                return pipeline
+    return IngestionPipeline(config=apykatu_cfg, progress_context=None) # type: ignore
+
+
+async def _release_ingestion_pipeline(apykatu_cfg: Any, pipeline: Any, reusable: bool) -> None:
+    """Returns a checked-out pipeline to the cache (closing any it evicts), or closes it if not `reusable`."""
+    if not reusable:
+        await _close_pipelines([pipeline])
+        return
+    evicted: List[Any] = []
+    with _APYKATU_CFG_CACHE_LOCK:
+        _PIPELINE_CACHE[id(pipeline)] = (apykatu_cfg, pipeline)
+        while len(_PIPELINE_CACHE) > INGEST_PIPELINE_CACHE_SIZE:
+            evicted.append(_PIPELINE_CACHE.popitem(last=False)[1][1])
+    if evicted:
+        await _close_pipelines(evicted)
+
+
+def _resolve_path(raw_path: str) -> Path:
+    """Returns `raw_path` expanded and resolved, reusing the result for repeated paths."""
+    resolved = _RESOLVED_PATHS.get(raw_path)
+    if resolved is None:
+        resolved = _RESOLVED_PATHS.setdefault(raw_path, Path(raw_path).expanduser().resolve())
+    return resolved
+
+
 def _get_apykatu_config_for_ingestion(collection_name_override: str) -> Optional[Any]: # Type Any for ApykatuAppConfig due to conditional import
     """
-    Prepares ApykatuAppConfig for an ingestion run.
+    Prepares ApykatuAppConfig for an ingestion run, memoized per collection name.
     It fetches LLMCore's [apykatu] settings from the LLMCore configuration,
     then overrides the database path and target collection name based on
     LLMCore's main vector store settings and the provided `collection_name_override`.
@@ -117,6 +372,16 @@ def _get_apykatu_config_for_ingestion(collection_name_override: str) -> Optional
         logger.error("Apykatu library or its core components not available for config preparation.")
         return None
 
+    global _APYKATU_CFG_CACHE_SOURCE
+    with _APYKATU_CFG_CACHE_LOCK:
+        if _APYKATU_CFG_CACHE_SOURCE != id(llmcore_instance.config):
+            _APYKATU_CFG_CACHE.clear()
+            _APYKATU_CFG_CACHE_SOURCE = id(llmcore_instance.config)
+        cached_config = _APYKATU_CFG_CACHE.get(collection_name_override)
+    if cached_config is not None:
+        logger.debug("Using memoized Apykatu config for collection '%s'.", collection_name_override)
+        return cached_config
+
     apykatu_settings_from_llmcore_raw = llmcore_instance.config.get('apykatu', {})
     apykatu_settings_from_llmcore: Dict[str, Any]
     if hasattr(apykatu_settings_from_llmcore_raw, 'as_dict'): # Check for Confy sub-config object
@@ -124,10 +389,10 @@ def _get_apykatu_config_for_ingestion(collection_name_override: str) -> Optional
     elif isinstance(apykatu_settings_from_llmcore_raw, dict):
         apykatu_settings_from_llmcore = apykatu_settings_from_llmcore_raw
     else:
-        logger.error(f"LLMCore's 'apykatu' config section is not a dictionary or Confy object. Type: {type(apykatu_settings_from_llmcore_raw)}")
+        logger.error("LLMCore's 'apykatu' config section is not a dictionary or Confy object. Type: %s", type(apykatu_settings_from_llmcore_raw))
         apykatu_settings_from_llmcore = {} # Fallback to empty dict
 
-    logger.debug(f"Apykatu settings from LLMCore for ingestion: {apykatu_settings_from_llmcore}")
+    logger.debug("Apykatu settings from LLMCore for ingestion: %s", apykatu_settings_from_llmcore)
 
     try:
         # Apykatu's config loading mechanism (ensure it's imported if APYKATU_AVAILABLE)
@@ -141,76 +406,88 @@ def _get_apykatu_config_for_ingestion(collection_name_override: str) -> Optional
         final_apykatu_config: Any = final_apykatu_config_tuple[0] # Type Any for ApykatuAppConfig
 
     except ApykatuConfigError as e_conf: # type: ignore
-        logger.error(f"ApykatuConfigError during Apykatu config loading: {e_conf}")
+        logger.error("ApykatuConfigError during Apykatu config loading: %s", e_conf)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error loading Apykatu config: {e}", exc_info=True)
+        logger.error("Unexpected error loading Apykatu config: %s", e, exc_info=True)
         return None
 
     # Override DB path and collection name from LLMCore's main vector store config
     llmcore_vector_db_path = llmcore_instance.config.get("storage.vector.path")
     if llmcore_vector_db_path:
-        final_apykatu_config.database.path = Path(llmcore_vector_db_path).expanduser().resolve()
+        final_apykatu_config.database.path = _resolve_path(llmcore_vector_db_path)
     else:
         logger.warning("LLMCore's storage.vector.path is not set. Apykatu will use its default DB path if not overridden elsewhere in its own config.")
 
     final_apykatu_config.database.collection_name = collection_name_override # Crucial override
-    logger.info(f"Apykatu config prepared for ingestion. Collection: '{collection_name_override}', DB Path: '{final_apykatu_config.database.path}'")
+    logger.info("Apykatu config prepared for ingestion. Collection: '%s', DB Path: '%s'", collection_name_override, final_apykatu_config.database.path)
+    with _APYKATU_CFG_CACHE_LOCK:
+        _APYKATU_CFG_CACHE[collection_name_override] = final_apykatu_config
     return final_apykatu_config
 
 
-async def stream_file_ingestion_progress(uploaded_files: List[Any], collection_name: str, temp_dir: Path, apykatu_cfg: Any) -> AsyncGenerator[str, None]:
+def _get_ingestion_concurrency() -> int:
+    """
+    Returns the per-request file ingestion concurrency: the INGEST_CONCURRENCY
+    environment variable if set, else `apykatu.ingestion_concurrency` from LLMCore's config.
     """
-    Async generator to process uploaded files one by one for ingestion and stream SSE progress.
-    Each file is saved temporarily, processed by Apykatu, and its chunks are added to
-    LLMCore's vector store.
+    raw_value = os.environ.get("INGEST_CONCURRENCY")
+    if raw_value is None:
+        raw_value = llmcore_instance.config.get("apykatu.ingestion_concurrency", 4) if llmcore_instance else 4
+    try:
+        return max(1, int(raw_value))
+    except (TypeError, ValueError):
+        logger.warning("Invalid ingestion concurrency value '%s'. Using 4.", raw_value)
+        return 4
 
-    Args:
-        uploaded_files: A list of Werkzeug FileStorage objects representing uploaded files.
-        collection_name: The target RAG collection name.
-        temp_dir: A Path object to a temporary directory for storing uploaded files during processing.
-        apykatu_cfg: The ApykatuAppConfig object configured for this ingestion task.
 
-    Yields:
-        Strings formatted as SSE messages detailing the ingestion progress.
-    """
-    if not llmcore_instance or not apykatu_process_file_path_api or not ApykatuProcessedChunk or not ApykatuProcessingStats: # type: ignore
-        logger.error("LLM service or Apykatu components not available for file ingestion stream.")
-        yield f"data: {json.dumps({'type': 'error', 'error': 'LLM service or Apykatu components not available.'})}\n\n"
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        return
+# Names that `secure_filename` returns unchanged: ASCII letters, digits, '.', '_' and
+# '-', not starting or ending with '.' or '_' (which it strips). Such names skip its
+# Unicode normalization and regex passes. On Windows it also renames device names
+# like "CON", so the fast path is disabled there.
+_SAFE_FILENAME_RE = re.compile(r"[A-Za-z0-9-](?:[A-Za-z0-9._-]*[A-Za-z0-9-])?")
+_SAFE_FILENAME_FAST_PATH = os.name != "nt"
 
-    total_files = len(uploaded_files)
-    overall_chunks_added = 0
-    overall_files_processed_successfully = 0
-    overall_files_with_errors = 0
-    all_error_messages: List[str] = []
 
-    logger.info(f"Starting file ingestion stream for {total_files} files into collection '{collection_name}'. Temp dir: {temp_dir}")
+def _fast_secure_filename(filename: str) -> str:
+    """`secure_filename`, short-circuited for names it would leave untouched."""
+    if _SAFE_FILENAME_FAST_PATH and _SAFE_FILENAME_RE.fullmatch(filename):
+        return filename
+    return secure_filename(filename)
 
-    for i, uploaded_file_storage in enumerate(uploaded_files):
-        filename = "unknown_file"
-        file_status = "pending"
-        file_error_msg: Optional[str] = None
-        chunks_this_file = 0
-        temp_file_path_local: Optional[Path] = None # Define here to ensure it's in scope for finally
-        try:
-            if not uploaded_file_storage or not uploaded_file_storage.filename:
-                logger.warning(f"Skipping invalid file upload object at index {i} for collection '{collection_name}'.")
-                file_error_msg = "Invalid file upload object received."
-                overall_files_with_errors +=1
-                all_error_messages.append(f"File {i+1}: {file_error_msg}")
-                yield f"data: {json.dumps({'type': 'file_end', 'filename': 'N/A', 'file_index': i, 'total_files': total_files, 'status': 'error', 'error_message': file_error_msg, 'chunks_added': 0})}\n\n"
-                await asyncio.sleep(0.01) # Ensure message is sent
-                continue
 
-            filename = secure_filename(uploaded_file_storage.filename)
-            yield f"data: {json.dumps({'type': 'file_start', 'filename': filename, 'file_index': i, 'total_files': total_files})}\n\n"
-            await asyncio.sleep(0.01)
+async def _ingest_uploaded_file(i: int, uploaded_file_storage: Any, collection_name: str, temp_dir: Path, apykatu_cfg: Any, semaphore: asyncio.Semaphore, events: "asyncio.Queue[Tuple[str, Dict[str, Any]]]") -> Dict[str, Any]:
+    """
+    Saves, processes and stores a single uploaded file for ingestion.
+    Runs under `semaphore` so that only a bounded number of files are embedded concurrently,
+    and puts a ("file_start", ...) entry on `events` once it actually starts work.
 
-            temp_file_path_local = temp_dir / filename # Assign to the scoped variable
-            uploaded_file_storage.save(str(temp_file_path_local)) # Ensure path is string for save()
-            logger.info(f"Processing uploaded file ({i+1}/{total_files}): '{filename}' for collection '{collection_name}' from path '{temp_file_path_local}'.")
+    Returns:
+        A dict with the `file_end` event fields for this file, plus an
+        `error_messages` list destined for the final summary. When Apykatu produced
+        embedded chunks, they are returned under `documents` for batched storage.
+    """
+    result: Dict[str, Any] = {
+        "filename": "N/A", "file_index": i, "status": "error",
+        "chunks_added": 0, "error_message": None, "error_messages": [],
+    }
+    if not uploaded_file_storage or not uploaded_file_storage.filename:
+        logger.warning("Skipping invalid file upload object at index %s for collection '%s'.", i, collection_name)
+        result["error_message"] = "Invalid file upload object received."
+        result["error_messages"].append(f"File {i+1}: {result['error_message']}")
+        return result
+
+    filename = _fast_secure_filename(uploaded_file_storage.filename)
+    result["filename"] = filename
+    # Each file gets its own subdirectory so concurrent uploads sharing a name cannot collide.
+    temp_file_path_local = temp_dir / str(i) / filename
+    async with semaphore:
+        events.put_nowait(("file_start", {"filename": filename, "file_index": i}))
+        try:
+            temp_file_path_local.parent.mkdir(parents=True, exist_ok=True)
+            # FileStorage.save() is a blocking copy; keep it off the event loop.
+            await asyncio.to_thread(uploaded_file_storage.save, str(temp_file_path_local), UPLOAD_COPY_BUFFER_BYTES)
+            logger.info("Processing uploaded file (%s): '%s' for collection '%s' from path '%s'.", i+1, filename, collection_name, temp_file_path_local)
 
             # Call Apykatu's API to process the file
             processed_chunks_apy, api_stats_obj_apy = await apykatu_process_file_path_api( # type: ignore
@@ -220,68 +497,219 @@ async def stream_file_ingestion_progress(uploaded_files: List[Any], collection_n
             processed_chunks: List[ApykatuProcessedChunk] = processed_chunks_apy # type: ignore
             api_stats_obj: ApykatuProcessingStats = api_stats_obj_apy # type: ignore
 
-
             if api_stats_obj.error_messages:
-                file_status = "error"
-                file_error_msg = "; ".join(api_stats_obj.error_messages)
-                all_error_messages.extend([f"File '{filename}': e" for e in api_stats_obj.error_messages])
-                overall_files_with_errors +=1
-                logger.warning(f"Errors processing file '{filename}' with Apykatu: {file_error_msg}")
-            else:
-                if processed_chunks:
-                    docs_for_llmcore = []
-                    for pc in processed_chunks:
-                        if pc.embedding_data and pc.embedding_data.get("vector"):
-                            meta_to_store = pc.metadata_from_apykatu.model_dump() if hasattr(pc.metadata_from_apykatu, 'model_dump') else pc.metadata_from_apykatu
-                            docs_for_llmcore.append({
-                                "id": pc.semantiscan_chunk_id,
-                                "content": pc.content_text,
-                                "embedding": pc.embedding_data["vector"],
-                                "metadata": meta_to_store
-                            })
-                        else:
-                            logger.warning(f"Chunk {pc.semantiscan_chunk_id} from file '{filename}' missing embedding. Skipping.")
-
-                    if docs_for_llmcore:
-                        added_ids = await llmcore_instance.add_documents_to_vector_store(
-                            documents=docs_for_llmcore, # type: ignore
-                            collection_name=collection_name
-                        )
-                        chunks_this_file = len(added_ids)
-                        overall_chunks_added += chunks_this_file
-                        file_status = "success"
-                        overall_files_processed_successfully +=1
-                        logger.info(f"Successfully added {chunks_this_file} chunks from file '{filename}' to collection '{collection_name}'.")
+                result["error_message"] = "; ".join(api_stats_obj.error_messages)
+                result["error_messages"].extend([f"File '{filename}': {e}" for e in api_stats_obj.error_messages])
+                logger.warning("Errors processing file '%s' with Apykatu: %s", filename, result['error_message'])
+            elif processed_chunks:
+                docs_for_llmcore = []
+                for pc in processed_chunks:
+                    if pc.embedding_data and pc.embedding_data.get("vector"):
+                        meta_to_store = pc.metadata_from_apykatu.model_dump() if hasattr(pc.metadata_from_apykatu, 'model_dump') else pc.metadata_from_apykatu
+                        docs_for_llmcore.append({
+                            "id": pc.semantiscan_chunk_id,
+                            "content": pc.content_text,
+                            "embedding": pc.embedding_data["vector"],
+                            "metadata": meta_to_store
+                        })
                     else:
-                        file_status = "warning_no_chunks_with_embeddings"
-                        file_error_msg = "No processable chunks with embeddings found by Apykatu."
-                        overall_files_with_errors +=1 # Count as error if no chunks added
-                        all_error_messages.append(f"File '{filename}': {file_error_msg}")
-                        logger.warning(f"File '{filename}' produced no chunks with embeddings by Apykatu.")
-                else: # No chunks produced by Apykatu
-                    file_status = "warning_no_chunks_produced"
-                    file_error_msg = "Apykatu processed the file but produced no chunks."
-                    overall_files_with_errors +=1 # Count as error
-                    all_error_messages.append(f"File '{filename}': {file_error_msg}")
-                    logger.warning(f"File '{filename}' produced no chunks by Apykatu.")
-
-            yield f"data: {json.dumps({'type': 'file_end', 'filename': filename, 'file_index': i, 'total_files': total_files, 'status': file_status, 'chunks_added': chunks_this_file, 'error_message': file_error_msg})}\n\n"
-            await asyncio.sleep(0.01)
-
+                        logger.warning("Chunk %s from file '%s' missing embedding. Skipping.", pc.semantiscan_chunk_id, filename)
+
+                if docs_for_llmcore:
+                    # Stored later in batches by the caller (see _store_document_batch).
+                    result["documents"] = docs_for_llmcore
+                else:
+                    result["status"] = "warning_no_chunks_with_embeddings"
+                    result["error_message"] = "No processable chunks with embeddings found by Apykatu."
+                    result["error_messages"].append(f"File '{filename}': {result['error_message']}")
+                    logger.warning("File '%s' produced no chunks with embeddings by Apykatu.", filename)
+            else: # No chunks produced by Apykatu
+                result["status"] = "warning_no_chunks_produced"
+                result["error_message"] = "Apykatu processed the file but produced no chunks."
+                result["error_messages"].append(f"File '{filename}': {result['error_message']}")
+                logger.warning("File '%s' produced no chunks by Apykatu.", filename)
         except Exception as e_file:
-            logger.error(f"Error processing file '{filename}' during ingestion stream for collection '{collection_name}': {e_file}", exc_info=True)
-            file_error_msg = str(e_file)
-            overall_files_with_errors +=1
-            all_error_messages.append(f"File '{filename}': {file_error_msg}")
-            yield f"data: {json.dumps({'type': 'file_end', 'filename': filename, 'file_index': i, 'total_files': total_files, 'status': 'error', 'error_message': file_error_msg, 'chunks_added': 0})}\n\n"
-            await asyncio.sleep(0.01)
+            # A bad batch can fail thousands of files; only format their tracebacks when debugging.
+            logger.error("Error processing file '%s' during ingestion stream for collection '%s': %s", filename, collection_name, e_file, exc_info=logger.isEnabledFor(logging.DEBUG))
+            result["status"] = "error"
+            result["error_message"] = str(e_file)
+            result["error_messages"].append(f"File '{filename}': {result['error_message']}")
         finally:
             # Clean up individual temp file if it exists
-            if temp_file_path_local and temp_file_path_local.exists():
+            if temp_file_path_local.exists():
                 try:
                     temp_file_path_local.unlink()
                 except OSError as e_unlink:
-                    logger.warning(f"Could not delete temporary file {temp_file_path_local}: {e_unlink}")
+                    logger.warning("Could not delete temporary file %s: %s", temp_file_path_local, e_unlink)
+    return result
+
+
+def _upload_size(file_storage: Any) -> int:
+    """
+    Best-effort size of an uploaded file in bytes, or 0 if unknown. Multipart
+    parts rarely carry a Content-Length, so the spooled stream is measured instead.
+    """
+    if file_storage.content_length:
+        return file_storage.content_length
+    stream = file_storage.stream
+    try:
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+async def _store_document_batch(batch: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]], collection_name: str) -> None:
+    """
+    Writes the documents of several processed files to the vector store in one call,
+    then fills in each file's `status` and `chunks_added` in place.
+
+    Args:
+        batch: Pairs of (per-file result dict, that file's documents).
+        collection_name: The target RAG collection name.
+    """
+    documents = [doc for _, file_docs in batch for doc in file_docs]
+    try:
+        added_ids = await llmcore_instance.add_documents_to_vector_store( # type: ignore
+            documents=documents, # type: ignore
+            collection_name=collection_name
+        )
+    except Exception as e_store:
+        logger.error("Error adding a batch of %s chunks to collection '%s': %s", len(documents), collection_name, e_store, exc_info=True)
+        for result, _ in batch:
+            result["status"] = "error"
+            result["error_message"] = str(e_store)
+            result["error_messages"].append(f"File '{result['filename']}': {e_store}")
+        return
+
+    all_added = len(added_ids) == len(documents)
+    added_id_set = set() if all_added else set(added_ids)
+    log_each_file = logger.isEnabledFor(logging.INFO)
+    for result, file_docs in batch:
+        result["chunks_added"] = len(file_docs) if all_added else sum(1 for doc in file_docs if doc["id"] in added_id_set)
+        result["status"] = "success"
+        if log_each_file:
+            logger.info("Successfully added %s chunks from file '%s' to collection '%s'.", result['chunks_added'], result['filename'], collection_name)
+
+
+async def stream_file_ingestion_progress(uploaded_files: List[Any], collection_name: str, temp_dir: Path, apykatu_cfg: Any) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Async generator to process uploaded files for ingestion and stream SSE progress.
+    Files are processed by concurrent worker tasks (bounded by INGEST_CONCURRENCY or
+    `apykatu.ingestion_concurrency`, default 4); each is saved temporarily, processed
+    by Apykatu, and its chunks are added to LLMCore's vector store. Workers report
+    through an event queue, so `file_start` is emitted when a file actually starts
+    and `file_end` once its chunks are stored, in whatever order files complete.
+
+    Args:
+        uploaded_files: A list of Werkzeug FileStorage objects representing uploaded files.
+        collection_name: The target RAG collection name.
+        temp_dir: A Path object to a temporary directory for storing uploaded files during processing.
+        apykatu_cfg: The ApykatuAppConfig object configured for this ingestion task.
+
+    Yields:
+        Event dicts (each with a 'type' key) detailing the ingestion progress.
+    """
+    if not llmcore_instance or not apykatu_process_file_path_api or not ApykatuProcessedChunk or not ApykatuProcessingStats: # type: ignore
+        logger.error("LLM service or Apykatu components not available for file ingestion stream.")
+        yield {'type': 'error', 'error': 'LLM service or Apykatu components not available.'}
+        yield _END_EVENT
+        return
+
+    total_files = len(uploaded_files)
+    overall_chunks_added = 0
+    overall_files_processed_successfully = 0
+    overall_files_with_errors = 0
+    all_error_messages: List[str] = []
+    suppressed_error_count = 0
+
+    concurrency = _get_ingestion_concurrency()
+    logger.info("Starting file ingestion stream for %s files into collection '%s' (concurrency %s). Temp dir: %s", total_files, collection_name, concurrency, temp_dir)
+
+    def _file_events(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Records a finished file in the running totals and returns its events."""
+        nonlocal overall_chunks_added, overall_files_processed_successfully, overall_files_with_errors, suppressed_error_count
+        for error_message in result.pop("error_messages"):
+            if len(all_error_messages) < INGEST_MAX_SUMMARY_ERRORS:
+                all_error_messages.append(error_message)
+            else:
+                suppressed_error_count += 1
+        if result["status"] == "success":
+            overall_files_processed_successfully += 1
+            overall_chunks_added += result["chunks_added"]
+        else:
+            overall_files_with_errors += 1
+        return [{'type': 'file_end', 'total_files': total_files, **result}]
+
+    # Embedded chunks are buffered across files and written to the vector store
+    # in batches; a file's file_end is emitted once its batch has been stored.
+    pending_batch: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+    pending_chunk_count = 0
+
+    semaphore = asyncio.Semaphore(concurrency)
+    events: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue()
+
+    async def _worker(i: int, uploaded_file_storage: Any) -> None:
+        try:
+            result = await _ingest_uploaded_file(i, uploaded_file_storage, collection_name, temp_dir, apykatu_cfg, semaphore, events)
+        except Exception as e_worker:
+            # _ingest_uploaded_file handles its own errors; this only keeps the consumer from waiting forever.
+            logger.error("Unexpected error in ingestion worker for file index %s: %s", i, e_worker, exc_info=True)
+            result = {
+                "filename": "N/A", "file_index": i, "status": "error", "chunks_added": 0,
+                "error_message": str(e_worker), "error_messages": [f"File {i+1}: {e_worker}"],
+            }
+        events.put_nowait(("file_done", result))
+
+    # Largest files first (LPT scheduling), so a big file does not start last and
+    # hold up the end of the run. Workers keep each file's original index, which
+    # is what the client sees as file_index; sorted() keeps ties in upload order.
+    dispatch_order = sorted(enumerate(uploaded_files), key=lambda item: _upload_size(item[1]), reverse=True)
+    tasks = [
+        asyncio.create_task(_worker(i, uploaded_file_storage))
+        for i, uploaded_file_storage in dispatch_order
+    ]
+    try:
+        files_remaining = total_files
+        while files_remaining:
+            event_kind, payload = await events.get()
+            if event_kind == "file_start":
+                yield {'type': 'file_start', 'total_files': total_files, **payload}
+                continue
+            files_remaining -= 1
+            result = payload
+            file_documents = result.pop("documents", None)
+            if not file_documents:
+                for file_event in _file_events(result):
+                    yield file_event
+                continue
+            pending_batch.append((result, file_documents))
+            pending_chunk_count += len(file_documents)
+            if pending_chunk_count >= INGEST_BATCH_CHUNKS:
+                await _store_document_batch(pending_batch, collection_name)
+                for batched_result, _ in pending_batch:
+                    for file_event in _file_events(batched_result):
+                        yield file_event
+                pending_batch, pending_chunk_count = [], 0
+    finally:
+        # Only reached with pending tasks if the stream is closed early, e.g. when
+        # the client disconnects and the server closes the response iterator.
+        unfinished = [task for task in tasks if not task.done()]
+        if unfinished:
+            logger.info("Ingestion stream for collection '%s' closed early; cancelling %s unfinished file(s).", collection_name, len(unfinished))
+            for task in unfinished:
+                task.cancel()
+            # Wait for the workers to unwind so their temp-file cleanup runs before the
+            # working directory is removed, rather than on the thread's next request.
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    if pending_batch:
+        await _store_document_batch(pending_batch, collection_name)
+        for batched_result, _ in pending_batch:
+            for file_event in _file_events(batched_result):
+                yield file_event
 
     # Final summary event
     summary_status = "no_files_processed"
@@ -294,21 +722,132 @@ async def stream_file_ingestion_progress(uploaded_files: List[Any], collection_n
             summary_status = "completed_with_all_errors"
 
 
-    summary_payload = {
-        "total_files_submitted": total_files,
-        "files_processed_successfully": overall_files_processed_successfully,
-        "files_with_errors": overall_files_with_errors,
-        "total_chunks_added_to_db": overall_chunks_added,
-        "collection_name": collection_name,
-        "error_messages": all_error_messages,
-        "status": summary_status
-    }
-    logger.info(f"File ingestion stream completed for collection '{collection_name}'. Summary: {summary_payload}")
-    yield f"data: {json.dumps({'type': 'ingestion_complete', 'summary': summary_payload})}\n\n"
-    yield f"data: {json.dumps({'type': 'end'})}\n\n" # Ensure stream ends properly
+    summary_payload = IngestSummary(
+        status=summary_status,
+        collection_name=collection_name,
+        total_files_submitted=total_files,
+        files_processed_successfully=overall_files_processed_successfully,
+        files_with_errors=overall_files_with_errors,
+        total_chunks_added_to_db=overall_chunks_added,
+        error_messages=all_error_messages + ([f"... {suppressed_error_count} more error(s) not shown."] if suppressed_error_count else []),
+    )
+    logger.info("File ingestion stream completed for collection '%s'. Summary: %s", collection_name, summary_payload)
+    # Ingestion may have created the collection and changes what RAG retrieves;
+    # drop the cached listing and any context previews built on the old contents.
+    listing_cache.invalidate(lambda key: key[0] == "rag_collections")
+    preview_cache.invalidate()
+    yield {'type': 'ingestion_complete', 'summary': summary_payload}
+    yield _END_EVENT # Ensure stream ends properly
+
+
+# Copy buffer for extracting ZIP members; larger than shutil's default to cut syscalls.
+ZIP_COPY_BUFFER_BYTES = 1 << 20
+# Copy buffer for saving uploads (Werkzeug's FileStorage.save defaults to 16 KiB).
+UPLOAD_COPY_BUFFER_BYTES = 1 << 20
+
+# ZIP extraction gets its own small pool rather than the loop's default executor, so a
+# few large archives cannot starve the other to_thread work. Threads suffice: zlib
+# releases the GIL while inflating, and the upload stream could not be sent to a process.
+_EXTRACT_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="llmchat_web_zip_extract"
+)
+
 
+def _zip_member_parts(member_name: str) -> List[str]:
+    """Splits a ZIP member name into path components, dropping drive, root, '.' and '..' parts."""
+    name = member_name.replace("\\", "/")
+    name = ntpath.splitdrive(name)[1]
+    return [part for part in name.split("/") if part not in ("", ".", "..")]
 
-async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collection_name: str, apykatu_cfg: Any, form_data: Dict[str, Any], files_data: Dict[str, Any]) -> AsyncGenerator[str, None]:
+
+def _extract_zip(zip_source: Any, target_dir: Path) -> int:
+    """
+    Extracts a ZIP archive into `target_dir` member by member (blocking; run via
+    _EXTRACT_EXECUTOR). `zip_source` may be a path or a seekable binary stream, such
+    as an upload's `FileStorage.stream`, so the archive need not be saved first.
+    Member names are kept as uploaded, minus any drive or absolute prefix and any
+    empty, '.' or '..' components (as `ZipFile.extractall` does); entries that would
+    still resolve outside `target_dir` are skipped.
+
+    Returns:
+        The number of files extracted.
+    """
+    target_root = target_dir.resolve()
+    files_extracted = 0
+    with zipfile.ZipFile(zip_source, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            safe_parts = _zip_member_parts(info.filename)
+            member_path = target_root.joinpath(*safe_parts).resolve() if safe_parts else None
+            if member_path is None or not member_path.is_relative_to(target_root):
+                logger.warning("Skipping ZIP member with unsafe path: %s", info.filename)
+                continue
+            member_path.parent.mkdir(parents=True, exist_ok=True)
+            with zip_ref.open(info) as src, open(member_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, ZIP_COPY_BUFFER_BYTES)
+            files_extracted += 1
+    return files_extracted
+
+
+# Matches progress lines from `git clone --progress`, e.g. "Receiving objects:  42% (420/1000)".
+_GIT_PROGRESS_RE = re.compile(r"^(?:remote: )?([A-Za-z][A-Za-z ]+):\s+(\d+)%")
+
+
+def _git_clone_command(git_url: str, target_dir: Path, git_ref: str) -> List[str]:
+    """Builds a shallow, single-branch `git clone` command line (partial unless GIT_PARTIAL_CLONE is off)."""
+    cmd = [GIT_EXECUTABLE or "git", "clone", "--progress", "--depth=1", "--single-branch"]
+    if GIT_PARTIAL_CLONE:
+        cmd.append("--filter=blob:none")
+    if git_ref != "HEAD":
+        cmd.extend(["--branch", git_ref])
+    cmd.extend(["--", git_url, str(target_dir)])
+    return cmd
+
+
+async def _git_clone_with_progress(git_url: str, target_dir: Path, git_ref: str) -> AsyncGenerator[Tuple[str, int], None]:
+    """
+    Clones `git_url` into `target_dir` with the git CLI, yielding (phase, percent)
+    tuples parsed from git's progress output whenever the percentage changes.
+
+    Raises:
+        RuntimeError: If git exits with a non-zero status.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *_git_clone_command(git_url, target_dir, git_ref),
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    last_progress: Optional[Tuple[str, int]] = None
+    recent_lines: List[str] = []
+    pending = b""
+    try:
+        while True:
+            data = await process.stderr.read(4096) # type: ignore[union-attr]
+            if not data:
+                break
+            # git rewrites progress lines in place with carriage returns.
+            *lines, pending = re.split(rb"[\r\n]", pending + data)
+            for raw_line in lines:
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                recent_lines = (recent_lines + [line])[-5:]
+                match = _GIT_PROGRESS_RE.match(line)
+                if match:
+                    progress = (match.group(1), int(match.group(2)))
+                    if progress != last_progress:
+                        last_progress = progress
+                        yield progress
+        return_code = await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if return_code != 0:
+        raise RuntimeError(f"git clone failed (exit code {return_code}): {' | '.join(recent_lines) or 'no output'}")
+
+
+async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collection_name: str, apykatu_cfg: Any, form_data: Dict[str, Any], files_data: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
     """
     Async generator for streaming SSE progress for directory ZIP and Git repository ingestion.
     Uses Apykatu's IngestionPipeline.
@@ -321,12 +860,12 @@ async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collectio
         files_data: Dictionary of uploaded files (e.g., for 'zip_file').
 
     Yields:
-        Strings formatted as SSE messages detailing the ingestion progress.
+        Event dicts (each with a 'type' key) detailing the ingestion progress.
     """
     if not llmcore_instance or not IngestionPipeline or not APYKATU_AVAILABLE:
-        logger.error(f"LLM service or Apykatu IngestionPipeline not available for '{ingest_type}' ingestion.")
-        yield f"data: {json.dumps({'type': 'error', 'error': f'Service or Apykatu pipeline not available for {ingest_type} ingestion.'})}\n\n"
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        logger.error("LLM service or Apykatu IngestionPipeline not available for '%s' ingestion.", ingest_type)
+        yield {'type': 'error', 'error': f'Service or Apykatu pipeline not available for {ingest_type} ingestion.'}
+        yield _END_EVENT
         return
 
     overall_status = "error" # Default to error
@@ -334,15 +873,14 @@ async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collectio
     details: Dict[str, Any] = {"ingest_type": ingest_type, "collection_name": collection_name}
     error_messages_list: List[str] = []
 
-    # Use a context manager for the temporary directory
-    with tempfile.TemporaryDirectory(prefix=f"llmchat_web_ingest_{ingest_type}_") as temp_dir_str:
-        temp_dir_path = Path(temp_dir_str)
-        logger.info(f"Starting '{ingest_type}' ingestion for collection '{collection_name}'. Temp dir: {temp_dir_path}")
+    pipeline: Any = None
+    # Use a context manager for the request's working directory
+    with _ingest_workdir(ingest_type) as temp_dir_path:
+        logger.info("Starting '%s' ingestion for collection '%s'. Temp dir: %s", ingest_type, collection_name, temp_dir_path)
         try:
-            yield f"data: {json.dumps({'type': 'ingestion_start', 'ingest_type': ingest_type, 'collection_name': collection_name})}\n\n"
-            await asyncio.sleep(0.01) # Ensure message is sent
+            yield {'type': 'ingestion_start', 'ingest_type': ingest_type, 'collection_name': collection_name}
 
-            pipeline = IngestionPipeline(config=apykatu_cfg, progress_context=None) # type: ignore
+            pipeline = _acquire_ingestion_pipeline(apykatu_cfg)
 
             if ingest_type == "dir_zip":
                 zip_file_storage = files_data.get("zip_file") # Assuming 'zip_file' is the key from request.files
@@ -351,13 +889,20 @@ async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collectio
                     raise ValueError(summary_message)
 
                 filename = secure_filename(zip_file_storage.filename)
-                temp_zip_path = temp_dir_path / filename
-                zip_file_storage.save(str(temp_zip_path))
                 extracted_dir_path = temp_dir_path / "unzipped_content"
                 extracted_dir_path.mkdir(parents=True, exist_ok=True)
-                with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(extracted_dir_path)
-                logger.info(f"Extracted ZIP '{filename}' to '{extracted_dir_path}'. Starting Apykatu pipeline for collection '{collection_name}'.")
+                # Extract straight from the upload stream when it is seekable (Werkzeug spools
+                # uploads to memory or a temp file), avoiding a second copy of the archive on disk.
+                zip_source: Any = zip_file_storage.stream
+                if not zip_source.seekable():
+                    zip_source = temp_dir_path / filename
+                    await asyncio.to_thread(zip_file_storage.save, str(zip_source), UPLOAD_COPY_BUFFER_BYTES)
+                # Extraction is blocking disk/zlib work; keep it off the event loop.
+                members_extracted = await asyncio.get_running_loop().run_in_executor(
+                    _EXTRACT_EXECUTOR, _extract_zip, zip_source, extracted_dir_path
+                )
+                details['files_extracted'] = members_extracted
+                logger.info("Extracted ZIP '%s' to '%s'. Starting Apykatu pipeline for collection '%s'.", filename, extracted_dir_path, collection_name)
 
                 repo_name_identifier = form_data.get("repo_name", extracted_dir_path.name) # From request.form
                 # Apykatu's pipeline.run is async
@@ -370,9 +915,9 @@ async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collectio
                 details['total_chunks_added_to_db'] = "N/A (dir)" # Placeholder
 
             elif ingest_type == "git":
-                if not GITPYTHON_AVAILABLE or not git:
-                    summary_message = "GitPython library not available for Git ingestion."
-                    raise ImportError(summary_message)
+                if not GIT_EXECUTABLE:
+                    summary_message = "git executable not available for Git ingestion."
+                    raise RuntimeError(summary_message)
                 git_url = form_data.get("git_url")
                 repo_name_for_git = form_data.get("repo_name") # This is the identifier, not necessarily the clone dir name
                 git_ref = form_data.get("git_ref") or "HEAD"
@@ -382,13 +927,12 @@ async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collectio
 
                 # Use a subdirectory within temp_dir_path for cloning to keep it clean
                 cloned_repo_path = temp_dir_path / secure_filename(repo_name_for_git) # Sanitize for path
-                cloned_repo_path.mkdir(parents=True, exist_ok=True)
 
-                logger.info(f"Cloning Git repo from '{git_url}' (ref: {git_ref}) to '{cloned_repo_path}' for collection '{collection_name}'.")
-                # Git clone is synchronous, run in thread for async context
-                await asyncio.to_thread(git.Repo.clone_from, git_url, str(cloned_repo_path), branch=git_ref if git_ref != "HEAD" else None, depth=1) # type: ignore
+                logger.info("Cloning Git repo from '%s' (ref: %s) to '%s' for collection '%s'.", git_url, git_ref, cloned_repo_path, collection_name)
+                async for phase, percent in _git_clone_with_progress(git_url, cloned_repo_path, git_ref):
+                    yield {'type': 'progress', 'stage': 'git_clone', 'message': phase, 'percent': percent}
 
-                logger.info(f"Git repo '{repo_name_for_git}' cloned. Starting Apykatu pipeline for collection '{collection_name}'.")
+                logger.info("Git repo '%s' cloned. Starting Apykatu pipeline for collection '%s'.", repo_name_for_git, collection_name)
                 await pipeline.run(repo_path=cloned_repo_path, repo_name=repo_name_for_git, git_ref=git_ref, mode='snapshot') # type: ignore
                 summary_message = f"Git repository '{repo_name_for_git}' (ref: {git_ref}) ingestion pipeline completed for collection '{collection_name}'."
                 overall_status = "success"
@@ -399,28 +943,35 @@ async def stream_other_ingestion_types_sse_async_gen(ingest_type: str, collectio
                 raise ValueError(summary_message)
 
         except Exception as e_other:
-            logger.error(f"Error during '{ingest_type}' ingestion stream for collection '{collection_name}': {e_other}", exc_info=True)
+            logger.error("Error during '%s' ingestion stream for collection '%s': %s", ingest_type, collection_name, e_other, exc_info=True)
             summary_message = str(e_other)
             overall_status = "error"
             error_messages_list.append(summary_message)
             details['error_message'] = summary_message # Store first error for details
-        # Temporary directory is cleaned up automatically by the 'with' statement
+        finally:
+            # Only a pipeline whose run completed goes back to the cache; one that
+            # failed or was interrupted (client disconnect) is closed instead.
+            if pipeline is not None:
+                await _release_ingestion_pipeline(apykatu_cfg, pipeline, reusable=overall_status == "success")
+        # The working directory is removed when the 'with' block exits
 
         # Construct final summary payload
-        final_summary_payload = {
-            "message": summary_message,
-            "status": overall_status,
-            "collection_name": collection_name,
-            "details": details, # Contains ingest_type, collection_name, and potentially error_message
-            "total_files_submitted": "N/A" if ingest_type != "file" else 0,
-            "files_processed_successfully": details.get('files_processed_successfully', "N/A (summary not detailed for this type)"),
-            "files_with_errors": details.get('files_with_errors', 0 if overall_status == "success" else "N/A (summary not detailed for this type)"),
-            "total_chunks_added_to_db": details.get('total_chunks_added_to_db', "N/A (summary not detailed for this type)"),
-            "error_messages": error_messages_list
-        }
-        logger.info(f"'{ingest_type}' ingestion stream completed for collection '{collection_name}'. Summary: {final_summary_payload}")
-        yield f"data: {json.dumps({'type': 'ingestion_complete', 'summary': final_summary_payload})}\n\n"
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        final_summary_payload = IngestSummary(
+            status=overall_status,
+            collection_name=collection_name,
+            total_files_submitted="N/A" if ingest_type != "file" else 0,
+            files_processed_successfully=details.get('files_processed_successfully', "N/A (summary not detailed for this type)"),
+            files_with_errors=details.get('files_with_errors', 0 if overall_status == "success" else "N/A (summary not detailed for this type)"),
+            total_chunks_added_to_db=details.get('total_chunks_added_to_db', "N/A (summary not detailed for this type)"),
+            error_messages=error_messages_list,
+            message=summary_message,
+            details=details, # Contains ingest_type, collection_name, and potentially error_message
+        )
+        logger.info("'%s' ingestion stream completed for collection '%s'. Summary: %s", ingest_type, collection_name, final_summary_payload)
+        listing_cache.invalidate(lambda key: key[0] == "rag_collections")
+        preview_cache.invalidate()
+        yield {'type': 'ingestion_complete', 'summary': final_summary_payload}
+        yield _END_EVENT
 
 
 # --- Data Ingestion API Endpoint ---
@@ -433,6 +984,13 @@ def ingest_data_route() -> Response:
     Streams progress back to the client using Server-Sent Events (SSE).
     Accessible at POST /api/ingest.
 
+    With `?format=jsonl` the same events are streamed as newline-delimited JSON
+    (`application/x-ndjson`) for programmatic clients. Each line holds a single
+    top-level key naming the event, so `{"file_end": {...}}` replaces the SSE
+    frame `data: {"type": "file_end", ...}`; the stream ends with `{"end": {}}`.
+    Bursts of events are coalesced: in SSE mode such a batch arrives as one
+    `data: [...]` frame holding an array of events.
+
     Request is expected to be 'multipart/form-data'.
     Form fields:
         - 'ingest_type': "file", "dir_zip", or "git"
@@ -441,61 +999,37 @@ def ingest_data_route() -> Response:
         - For 'dir_zip': 'zip_file' (single ZIP file), 'repo_name' (optional identifier)
         - For 'git': 'git_url', 'repo_name' (identifier), 'git_ref' (optional branch/tag/commit)
     """
-    if not llmcore_instance:
-        def error_stream_llm_unavailable():
-            yield f"data: {json.dumps({'type': 'error', 'error': 'LLM service not available.'})}\n\n"
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        return Response(stream_with_context(error_stream_llm_unavailable()), mimetype='text/event-stream')
-
     if not APYKATU_AVAILABLE:
-        def error_stream_apykatu_unavailable():
-            yield f"data: {json.dumps({'type': 'error', 'error': 'Apykatu ingestion service not available.'})}\n\n"
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        return Response(stream_with_context(error_stream_apykatu_unavailable()), mimetype='text/event-stream')
+        return _error_response('Apykatu ingestion service not available.', status=200)
 
     ingest_type = request.form.get("ingest_type")
     collection_name = request.form.get("collection_name")
 
     if not ingest_type or not collection_name:
         logger.warning("Ingestion request missing 'ingest_type' or 'collection_name'.")
-        def error_stream_missing_params():
-            yield f"data: {json.dumps({'type': 'error', 'error': 'Missing ingest_type or collection_name.'})}\n\n"
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        return Response(stream_with_context(error_stream_missing_params()), status=400, mimetype='text/event-stream')
+        return _error_response('Missing ingest_type or collection_name.')
 
-    logger.info(f"Received ingestion request. Type: {ingest_type}, Collection: {collection_name}")
+    logger.info("Received ingestion request. Type: %s, Collection: %s", ingest_type, collection_name)
 
     apykatu_cfg = _get_apykatu_config_for_ingestion(collection_name)
     if not apykatu_cfg:
-        logger.error(f"Failed to prepare Apykatu configuration for ingestion into '{collection_name}'.")
-        def error_stream_apykatu_cfg():
-            yield f"data: {json.dumps({'type': 'error', 'error': 'Failed to prepare Apykatu configuration.'})}\n\n"
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        return Response(stream_with_context(error_stream_apykatu_cfg()), status=500, mimetype='text/event-stream')
+        logger.error("Failed to prepare Apykatu configuration for ingestion into '%s'.", collection_name)
+        return _error_response('Failed to prepare Apykatu configuration.', status=500)
 
     if ingest_type == "file":
         uploaded_files = request.files.getlist("files[]") # Get list of FileStorage objects
         if not uploaded_files or not any(f.filename for f in uploaded_files):
-            logger.warning(f"File ingestion request for '{collection_name}' received no files.")
-            def error_stream_no_files():
-                yield f"data: {json.dumps({'type': 'error', 'error': 'No files provided for file ingestion.'})}\n\n"
-                yield f"data: {json.dumps({'type': 'end'})}\n\n"
-            return Response(stream_with_context(error_stream_no_files()), status=400, mimetype='text/event-stream')
-
-        # Use a TemporaryDirectory that cleans itself up
-        temp_dir_manager = tempfile.TemporaryDirectory(prefix="llmchat_web_ingest_files_")
-        temp_dir_path = Path(temp_dir_manager.name)
+            logger.warning("File ingestion request for '%s' received no files.", collection_name)
+            return _error_response('No files provided for file ingestion.')
 
         def file_ingestion_stream_generator_wrapper():
-            try:
+            # The working directory is removed in the background once the stream ends or is closed
+            with _ingest_workdir("files") as temp_dir_path:
                 # Pass temp_dir_path to the async generator
-                for event in run_async_generator_synchronously(stream_file_ingestion_progress, uploaded_files, collection_name, temp_dir_path, apykatu_cfg):
+                for event in run_async_generator_synchronously(_coalesced_ingest_events, stream_file_ingestion_progress, uploaded_files, collection_name, temp_dir_path, apykatu_cfg):
                     yield event
-            finally:
-                temp_dir_manager.cleanup() # Ensure cleanup if not already done by context manager exit
-                logger.info(f"Cleaned up temporary directory for file ingestion: {temp_dir_path}")
 
-        return Response(stream_with_context(file_ingestion_stream_generator_wrapper()), mimetype='text/event-stream')
+        return _event_stream_response(file_ingestion_stream_generator_wrapper())
 
     elif ingest_type in ["dir_zip", "git"]:
         # For dir_zip and git, we pass form data and files data to the async generator
@@ -504,6 +1038,7 @@ def ingest_data_route() -> Response:
         files_data_dict = {k: v for k, v in request.files.items()} # Convert ImmutableMultiDict to dict
 
         sync_generator = run_async_generator_synchronously(
+            _coalesced_ingest_events,
             stream_other_ingestion_types_sse_async_gen,
             ingest_type,
             collection_name,
@@ -511,13 +1046,10 @@ def ingest_data_route() -> Response:
             form_data_dict,
             files_data_dict
         )
-        return Response(stream_with_context(sync_generator), mimetype='text/event-stream')
+        return _event_stream_response(sync_generator)
 
     else:
-        logger.warning(f"Unsupported ingestion type received: {ingest_type}")
-        def error_stream_unsupported_type():
-            yield f"data: {json.dumps({'type': 'error', 'error': f'Unsupported ingestion type: {ingest_type}.'})}\n\n"
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        return Response(stream_with_context(error_stream_unsupported_type()), status=400, mimetype='text/event-stream')
+        logger.warning("Unsupported ingestion type received: %s", ingest_type)
+        return _error_response(f'Unsupported ingestion type: {ingest_type}.')
 
 logger.info("Data ingestion routes (/api/ingest) defined on ingest_bp.")
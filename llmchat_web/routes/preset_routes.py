@@ -39,11 +39,6 @@ async def list_presets_route() -> Any:
         JSON response with a list of preset metadata (name, description, etc.),
         or an error message.
     """
-    if not llmcore_instance:
-        logger.error(
-            "Attempted to list presets, but LLM service is not available."
-        )
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         presets_meta = await llmcore_instance.list_context_presets()
         logger.info(f"Successfully listed {len(presets_meta)} context presets.")
@@ -66,12 +61,6 @@ async def create_preset_route() -> Any:
     Returns:
         JSON response with the data of the created preset or an error message.
     """
-    if not llmcore_instance:
-        logger.error(
-            "Attempted to create a preset, but LLM service is not available."
-        )
-        return jsonify({"error": "LLM service not available."}), 503
-
     data = request.json
     if not data or "name" not in data or "items" not in data:
         return jsonify({
@@ -107,11 +96,6 @@ async def get_preset_route(preset_name: str) -> Any:
     Returns:
         JSON response with the full preset data or a 404 error if not found.
     """
-    if not llmcore_instance:
-        logger.error(
-            f"Attempted to get preset '{preset_name}', but LLM service is not available."
-        )
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         preset = await llmcore_instance.load_context_preset(preset_name)
         if preset:
@@ -142,12 +126,6 @@ async def update_preset_route(preset_name: str) -> Any:
     Returns:
         JSON response with the updated preset data or an error message.
     """
-    if not llmcore_instance:
-        logger.error(
-            f"Attempted to update preset '{preset_name}', but LLM service is not available."
-        )
-        return jsonify({"error": "LLM service not available."}), 503
-
     data = request.json
     if (not data or "name" not in data or "items" not in data or
             data["name"] != preset_name):
@@ -185,11 +163,6 @@ async def delete_preset_route(preset_name: str) -> Any:
     Returns:
         JSON response confirming deletion or an error message.
     """
-    if not llmcore_instance:
-        logger.error(
-            f"Attempted to delete preset '{preset_name}', but LLM service is not available."
-        )
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         deleted = await llmcore_instance.delete_context_preset(preset_name)
         if deleted:
@@ -221,12 +194,6 @@ async def rename_preset_route(old_name: str) -> Any:
     Returns:
         JSON response confirming the rename or an error message.
     """
-    if not llmcore_instance:
-        logger.error(
-            f"Attempted to rename preset '{old_name}', but LLM service is not available."
-        )
-        return jsonify({"error": "LLM service not available."}), 503
-
     data = request.json
     if not data or "new_name" not in data or not data["new_name"].strip():
         return jsonify({
@@ -5,19 +5,27 @@ in the llmchat-web application. Handles listing RAG collections,
 updating session-specific RAG settings, and performing direct RAG searches.
 """
 import logging
-import json # For parsing JSON in rag_filter if needed, though client sends object
 from typing import Any, Dict, List, Optional # Added Optional for type hinting
 
-from flask import jsonify, request
+import orjson
+from flask import jsonify
 from flask import session as flask_session
+from pydantic import TypeAdapter
 
 # Import the specific blueprint defined in the routes package's __init__.py
 from . import rag_bp
+from .utils import (
+    SingleFlight, dump_json_list, json_response, listing_cache, ndjson_response, parse_json_body,
+    request_fingerprint, wants_ndjson
+)
+
+from ..models import RagSearchRequest, RagSettingsUpdateRequest
 
 # Import shared components from the main app module (llmchat_web.app)
 from ..app import (
     llmcore_instance,
     async_to_sync_in_flask,
+    llmcore_optional,
     logger as app_logger # Main app logger
 )
 
@@ -36,6 +44,12 @@ if not logger.handlers and app_logger:
     else:
         logger.setLevel(app_logger.level if app_logger else logging.DEBUG)
 
+# Dumps a whole list of search results to JSON bytes in one pydantic-core pass.
+_DOCUMENTS_ADAPTER = TypeAdapter(List[LLMCoreContextDocument])
+
+# Identical searches issued concurrently (e.g. double-submits) share one vector-store query.
+_search_flight = SingleFlight()
+
 
 # --- RAG Settings and Search API Endpoints ---
 # rag_bp has url_prefix='/api/rag'.
@@ -46,15 +60,21 @@ async def get_rag_collections_route() -> Any:
     """
     Lists available RAG collections from LLMCore's vector store.
     Accessible at GET /api/rag/collections.
+    The serialized listing is cached briefly (see `listing_cache`) so repeated
+    settings-panel opens do not each round-trip to the vector store.
     """
-    if not llmcore_instance:
-        logger.error("Attempted to list RAG collections, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
+    cache_key = ("rag_collections", None)
+    cached_body = listing_cache.get(cache_key)
+    if cached_body is not None:
+        logger.debug("Serving RAG collections from listing cache.")
+        return json_response(cached_body)
     try:
         logger.debug("Fetching RAG collections from LLMCore.")
         collections = await llmcore_instance.list_rag_collections()
-        logger.info(f"Successfully listed {len(collections)} RAG collections.")
-        return jsonify(collections)
+        logger.info("Successfully listed %s RAG collections.", len(collections))
+        body = orjson.dumps(collections)
+        listing_cache.set(cache_key, body)
+        return json_response(body)
     except VectorStorageError as e_vs:
         logger.error(f"VectorStorageError listing RAG collections: {e_vs}", exc_info=True)
         return jsonify({"error": f"Failed to access RAG collections storage: {str(e_vs)}"}), 500
@@ -67,6 +87,7 @@ async def get_rag_collections_route() -> Any:
 
 
 @rag_bp.route("/settings/update", methods=["POST"])
+@llmcore_optional
 def update_rag_settings_route() -> Any:
     """
     Updates RAG settings (enabled, collectionName, kValue, filter) in the Flask session.
@@ -79,41 +100,47 @@ def update_rag_settings_route() -> Any:
         "filter": "json_object_or_null"
     }
     """
-    data = request.json
-    if not data:
-        logger.warning("Update RAG settings called with no JSON data.")
-        return jsonify({"error": "No data provided."}), 400
+    req = parse_json_body(RagSettingsUpdateRequest)
+    provided_fields = req.model_fields_set
 
-    # Update Flask session with values from request, falling back to existing session values if not provided
-    flask_session['rag_enabled'] = data.get('enabled', flask_session.get('rag_enabled', False))
-    flask_session['rag_collection_name'] = data.get('collectionName', flask_session.get('rag_collection_name'))
-    flask_session['rag_k_value'] = data.get('kValue', flask_session.get('rag_k_value', 3))
+    # Take values from the request, falling back to existing session values if not provided
+    rag_enabled = req.enabled if 'enabled' in provided_fields else flask_session.get('rag_enabled', False)
+    rag_collection_name = req.collection_name if 'collection_name' in provided_fields else flask_session.get('rag_collection_name')
+    rag_k_value = req.k_value if 'k_value' in provided_fields else flask_session.get('rag_k_value', 3)
 
     # Handle RAG filter: client sends a JSON object or null.
     # Store as dict or None in session.
-    filter_input = data.get('filter')
+    filter_input = req.filter
+    rag_filter: Optional[Dict[str, Any]]
     if isinstance(filter_input, dict) and filter_input: # Non-empty dictionary
-        flask_session['rag_filter'] = filter_input
+        rag_filter = filter_input
     elif filter_input is None or (isinstance(filter_input, dict) and not filter_input): # Explicitly null or empty dict
-        flask_session['rag_filter'] = None
+        rag_filter = None
     else:
         # If filter_input is something else (e.g., a string that's not valid JSON, though client should send obj/null)
-        logger.warning(f"Received RAG filter of unexpected type or structure: {filter_input}. Storing None.")
-        flask_session['rag_filter'] = None # Default to None if input is not a valid dict or explicit null
-
-    flask_session.modified = True # Ensure session is saved
-
-    logger.info(f"Flask session RAG settings updated: Enabled={flask_session['rag_enabled']}, "
-                f"Collection={flask_session['rag_collection_name']}, K={flask_session['rag_k_value']}, "
-                f"Filter={flask_session['rag_filter']}")
+        logger.warning("Received RAG filter of unexpected type or structure: %s. Storing None.", filter_input)
+        rag_filter = None # Default to None if input is not a valid dict or explicit null
+
+    # The UI re-posts these settings whenever the panel opens; only write (and
+    # re-serialize) the session when something actually changed.
+    rag_settings_keys = ('rag_enabled', 'rag_collection_name', 'rag_k_value', 'rag_filter')
+    new_rag_settings = (rag_enabled, rag_collection_name, rag_k_value, rag_filter)
+    if tuple(flask_session.get(key) for key in rag_settings_keys) == new_rag_settings:
+        logger.debug("RAG settings unchanged; Flask session left untouched.")
+    else:
+        for key, value in zip(rag_settings_keys, new_rag_settings):
+            flask_session[key] = value
+        flask_session.modified = True # Ensure session is saved
+        logger.info("Flask session RAG settings updated: Enabled=%s, Collection=%s, K=%s, Filter=%s",
+                    rag_enabled, rag_collection_name, rag_k_value, rag_filter)
 
     return jsonify({
         "message": "RAG settings updated in session.",
         "rag_settings": {
-            "enabled": flask_session['rag_enabled'],
-            "collection_name": flask_session['rag_collection_name'],
-            "k_value": flask_session['rag_k_value'],
-            "filter": flask_session['rag_filter'], # Return the processed filter (dict or None)
+            "enabled": rag_enabled,
+            "collection_name": rag_collection_name,
+            "k_value": rag_k_value,
+            "filter": rag_filter, # Return the processed filter (dict or None)
         }
     })
 
@@ -132,22 +159,18 @@ async def direct_rag_search_route() -> Any:
         "k": "optional_k_value",
         "filter": "optional_filter_object_or_null"
     }
+    Results are returned as a JSON array, or streamed one document per line
+    as NDJSON when requested with `?format=ndjson` or `Accept: application/x-ndjson`.
     """
-    if not llmcore_instance:
-        logger.error("Attempted direct RAG search, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
-    data = request.json
-    if not data or "query" not in data:
-        logger.warning("Direct RAG search called without 'query' in JSON payload.")
-        return jsonify({"error": "Missing 'query' in request."}), 400
+    req = parse_json_body(RagSearchRequest)
+    provided_fields = req.model_fields_set
 
-    query: str = data["query"]
+    query: str = req.query
     # Use request values if provided, else fallback to Flask session values
-    collection_name: Optional[str] = data.get("collection_name", flask_session.get('rag_collection_name'))
-    k_value_str: Any = data.get("k", flask_session.get('rag_k_value', 3)) # k can be int or str
+    collection_name: Optional[str] = req.collection_name if "collection_name" in provided_fields else flask_session.get('rag_collection_name')
+    k_value_str: Any = req.k if "k" in provided_fields else flask_session.get('rag_k_value', 3) # Session value may be int or str
     # Filter from request, fallback to session. Client sends object or null.
-    metadata_filter: Optional[Dict[str, Any]] = data.get("filter", flask_session.get('rag_filter'))
+    metadata_filter: Optional[Dict[str, Any]] = req.filter if "filter" in provided_fields else flask_session.get('rag_filter')
 
 
     if not collection_name:
@@ -157,29 +180,34 @@ async def direct_rag_search_route() -> Any:
             logger.warning("Direct RAG search: No collection specified and no default LLMCore collection configured.")
             return jsonify({"error": "No RAG collection specified and no default LLMCore collection configured."}), 400
         collection_name = default_llmcore_collection
-        logger.info(f"No collection specified for direct RAG search, using LLMCore default: {collection_name}")
+        logger.info("No collection specified for direct RAG search, using LLMCore default: %s", collection_name)
 
     try:
         k_value = int(k_value_str) # Ensure k is an integer
         if k_value <= 0:
-            logger.warning(f"Invalid K value for direct RAG search: {k_value}. Must be positive.")
+            logger.warning("Invalid K value for direct RAG search: %s. Must be positive.", k_value)
             return jsonify({"error": "K value for search must be a positive integer."}), 400
     except (ValueError, TypeError):
-        logger.warning(f"Invalid K value for direct RAG search: '{k_value_str}'. Defaulting to 3.")
+        logger.warning("Invalid K value for direct RAG search: '%s'. Defaulting to 3.", k_value_str)
         k_value = 3 # Default to a sensible value if parsing fails
 
-    logger.info(f"Performing direct RAG search: Query='{query[:50]}...', Collection='{collection_name}', K={k_value}, Filter={metadata_filter}")
+    logger.info("Performing direct RAG search: Query='%s...', Collection='%s', K=%s, Filter=%s", query[:50], collection_name, k_value, metadata_filter)
 
     try:
-        search_results: List[LLMCoreContextDocument] = await llmcore_instance.search_vector_store(
-            query=query,
-            k=k_value,
-            collection_name=collection_name,
-            filter_metadata=metadata_filter # Pass filter as is (dict or None)
+        search_key = request_fingerprint(query, k_value, collection_name, metadata_filter)
+        search_results: List[LLMCoreContextDocument] = await _search_flight.run(
+            search_key,
+            lambda: llmcore_instance.search_vector_store(
+                query=query,
+                k=k_value,
+                collection_name=collection_name,
+                filter_metadata=metadata_filter # Pass filter as is (dict or None)
+            )
         )
-        results_dict_list = [doc.model_dump(mode="json") for doc in search_results]
-        logger.info(f"Direct RAG search completed. Found {len(results_dict_list)} results for query '{query[:50]}...' in collection '{collection_name}'.")
-        return jsonify(results_dict_list)
+        logger.info("Direct RAG search completed. Found %s results for query '%s...' in collection '%s'.", len(search_results), query[:50], collection_name)
+        if wants_ndjson():
+            return ndjson_response(search_results)
+        return json_response(await dump_json_list(_DOCUMENTS_ADAPTER, search_results))
     except (VectorStorageError, LLMCoreError) as e:
         logger.error(f"Error during direct RAG search for query '{query[:50]}...' in '{collection_name}': {e}", exc_info=True)
         return jsonify({"error": f"Direct RAG search failed: {str(e)}"}), 500
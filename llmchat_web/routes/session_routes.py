@@ -14,6 +14,7 @@ from flask import session as flask_session
 
 # Import the specific blueprint defined in the routes package's __init__.py
 from . import session_bp
+from .utils import invalidate_session_caches
 
 # Import shared components from the main app module (llmchat_web.app)
 from ..app import (
@@ -22,6 +23,8 @@ from ..app import (
     get_context_usage_info, # Import the helper function
     get_current_web_session_id,
     set_current_web_session_id,
+    get_default_model_name,
+    get_default_provider_name,
     logger as app_logger # Main app logger
 )
 
@@ -51,9 +54,6 @@ async def list_sessions_route() -> Any:
     Lists all available LLMCore sessions.
     Retrieves session metadata (ID, name, updated_at, message_count, context_item_count) from LLMCore.
     """
-    if not llmcore_instance:
-        logger.error("Attempted to list sessions, but LLM service (llmcore_instance) is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         sessions = await llmcore_instance.list_sessions() # Returns List[Dict[str, Any]]
         logger.info(f"Successfully listed {len(sessions)} sessions.")
@@ -76,9 +76,6 @@ async def new_session_route() -> Any:
     to their defaults, typically derived from LLMCore's application configuration.
     An actual persistent LLMCore session is created by LLMCore on the first chat message if `save_session=True`.
     """
-    if not llmcore_instance:
-        logger.error("Attempted to create new session context, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         new_llmcore_session_id = f"web_session_{uuid.uuid4().hex}"
         set_current_web_session_id(new_llmcore_session_id)
@@ -93,13 +90,11 @@ async def new_session_route() -> Any:
         flask_session['rag_k_value'] = llmcore_cfg.get("context_management.rag_retrieval_k", 3)
         flask_session['rag_filter'] = None # Always reset filter to None for a new session context
 
-        default_provider = llmcore_cfg.get("llmcore.default_provider")
+        default_provider = get_default_provider_name()
         flask_session['current_provider_name'] = default_provider
         logger.debug(f"New session: Flask session 'current_provider_name' reset to app default: {default_provider}")
 
-        default_model_for_provider = None
-        if default_provider and llmcore_cfg.get(f"providers.{default_provider}"): # Check provider section exists
-            default_model_for_provider = llmcore_cfg.get(f"providers.{default_provider}.default_model")
+        default_model_for_provider = get_default_model_name(default_provider)
         flask_session['current_model_name'] = default_model_for_provider
         logger.debug(f"New session: Flask session 'current_model_name' reset to provider default: {default_model_for_provider}")
 
@@ -148,9 +143,6 @@ async def load_session_route(session_id_to_load: str) -> Any:
     Retrieves the session's data, updates Flask session settings based on
     the session's metadata, and includes the last known context usage info.
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to load session {session_id_to_load}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         logger.info(f"Attempting to load LLMCore session: {session_id_to_load}")
         session_obj: Optional[LLMCoreChatSession] = await llmcore_instance.get_session(session_id_to_load)
@@ -167,15 +159,11 @@ async def load_session_route(session_id_to_load: str) -> Any:
         logger.debug(f"Load session: LLMCore session '{session_id_to_load}' metadata loaded: {session_metadata}")
 
         # Update Flask session with settings from loaded LLMCore session metadata or app defaults
-        flask_session['current_provider_name'] = session_metadata.get('current_provider_name', llmcore_cfg.get("llmcore.default_provider"))
+        flask_session['current_provider_name'] = session_metadata.get('current_provider_name', get_default_provider_name())
         if 'current_model_name' in session_metadata:
             flask_session['current_model_name'] = session_metadata['current_model_name']
         else:
-            provider_for_model_fallback = flask_session['current_provider_name']
-            default_model_for_provider = None
-            if provider_for_model_fallback and llmcore_cfg.get(f"providers.{provider_for_model_fallback}"):
-                default_model_for_provider = llmcore_cfg.get(f"providers.{provider_for_model_fallback}.default_model")
-            flask_session['current_model_name'] = default_model_for_provider
+            flask_session['current_model_name'] = get_default_model_name(flask_session['current_provider_name'])
         logger.info(f"Load session: Flask session provider set to '{flask_session['current_provider_name']}', model to '{flask_session['current_model_name']}'.")
 
         flask_session['system_message'] = session_metadata.get('system_message', llmcore_cfg.get("llmcore.default_system_message", ""))
@@ -226,14 +214,12 @@ async def delete_session_route(session_id_to_delete: str) -> Any:
     If the deleted session was the currently active web session,
     the current web session ID in Flask session is cleared.
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to delete session {session_id_to_delete}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         logger.info(f"Attempting to delete session: {session_id_to_delete}")
         deleted = await llmcore_instance.delete_session(session_id_to_delete)
         if deleted:
             logger.info(f"Successfully deleted session {session_id_to_delete} from LLMCore.")
+            invalidate_session_caches(session_id_to_delete)
             if get_current_web_session_id() == session_id_to_delete:
                 set_current_web_session_id(None)
                 flask_session.modified = True
@@ -269,10 +255,6 @@ async def rename_session_route(session_id: str) -> Any:
         invalid payload, or backend error), it returns an error message with an
         appropriate HTTP status code (400, 404, 500).
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to rename session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
     data = request.json
     if not data or "new_name" not in data or not isinstance(data["new_name"], str) or not data["new_name"].strip():
         logger.warning(f"Rename session {session_id} called with invalid or missing 'new_name' in payload.")
@@ -307,14 +289,12 @@ async def delete_message_from_session_route(session_id: str, message_id: str) ->
     """
     Deletes a specific message from a given LLMCore session.
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to delete message {message_id} from session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         logger.info(f"Attempting to delete message '{message_id}' from session '{session_id}'.")
         success = await llmcore_instance.delete_message_from_session(session_id, message_id)
         if success:
             logger.info(f"Successfully deleted message '{message_id}' from session '{session_id}'.")
+            invalidate_session_caches(session_id)
             return jsonify({"message": f"Message '{message_id}' deleted from session '{session_id}'."})
         else:
             logger.warning(f"Message '{message_id}' not found in session '{session_id}' or could not be deleted by LLMCore.")
@@ -340,10 +320,6 @@ async def update_session_metadata_route(session_id: str) -> Any:
 
     Expects JSON payload: `{"client_data": {...}, "client_key": "optional_key_name"}`
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to update metadata for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
     data = request.json
     if not data or "client_data" not in data:
         logger.warning(f"Update session metadata for {session_id} called without 'client_data' in payload.")
@@ -7,16 +7,25 @@ and RAG prompt template values.
 import logging
 from typing import Any, Dict, Optional
 
-from flask import jsonify, request
+import orjson
+from flask import jsonify
 from flask import session as flask_session
 
 # Import the specific blueprint defined in the routes package's __init__.py
 from . import settings_bp
+from .utils import json_response, listing_cache, parse_json_body
+
+from ..models import (
+    LlmSettingsUpdateRequest, PromptTemplateBatchUpdateRequest, PromptTemplateKeyRequest,
+    PromptTemplateValueRequest, SystemMessageUpdateRequest
+)
 
 # Import shared components from the main app module (llmchat_web.app)
 from ..app import (
     llmcore_instance,
     async_to_sync_in_flask,
+    llmcore_optional,
+    get_default_model_name,
     logger as app_logger
 )
 
@@ -33,14 +42,18 @@ if not logger.handlers and app_logger:
 @settings_bp.route("/llm/providers", methods=["GET"])
 @async_to_sync_in_flask
 async def get_llm_providers_route() -> Any:
-    if not llmcore_instance:
-        logger.error("Attempted to list LLM providers, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
+    cache_key = ("llm_providers", None)
+    cached_body = listing_cache.get(cache_key)
+    if cached_body is not None:
+        logger.debug("Serving LLM providers from listing cache.")
+        return json_response(cached_body)
     try:
         logger.debug("Fetching available LLM providers from LLMCore.")
         providers = llmcore_instance.get_available_providers()
-        logger.info(f"Successfully listed {len(providers)} LLM providers.")
-        return jsonify(providers)
+        logger.info("Successfully listed %s LLM providers.", len(providers))
+        body = orjson.dumps(providers)
+        listing_cache.set(cache_key, body)
+        return json_response(body)
     except LLMCoreError as e:
         logger.error(f"Error listing LLM providers: {e}", exc_info=True)
         return jsonify({"error": f"Failed to list LLM providers: {str(e)}"}), 500
@@ -51,14 +64,18 @@ async def get_llm_providers_route() -> Any:
 @settings_bp.route("/llm/providers/<provider_name>/models", methods=["GET"])
 @async_to_sync_in_flask
 async def get_llm_models_route(provider_name: str) -> Any:
-    if not llmcore_instance:
-        logger.error(f"Attempted to list models for provider {provider_name}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
+    cache_key = ("llm_models", provider_name)
+    cached_body = listing_cache.get(cache_key)
+    if cached_body is not None:
+        logger.debug("Serving models for provider %s from listing cache.", provider_name)
+        return json_response(cached_body)
     try:
-        logger.debug(f"Fetching models for LLM provider: {provider_name}")
+        logger.debug("Fetching models for LLM provider: %s", provider_name)
         models = llmcore_instance.get_models_for_provider(provider_name)
-        logger.info(f"Successfully listed {len(models)} models for provider {provider_name}.")
-        return jsonify(models)
+        logger.info("Successfully listed %s models for provider %s.", len(models), provider_name)
+        body = orjson.dumps(models)
+        listing_cache.set(cache_key, body)
+        return json_response(body)
     except LLMCoreError as e:
         logger.error(f"Error listing models for provider {provider_name}: {e}", exc_info=True)
         return jsonify({"error": f"Failed to list models for provider '{provider_name}': {str(e)}"}), 500
@@ -67,23 +84,16 @@ async def get_llm_models_route(provider_name: str) -> Any:
         return jsonify({"error": "An unexpected server error occurred."}), 500
 
 @settings_bp.route("/llm/update", methods=["POST"])
+@llmcore_optional
 def update_llm_settings_route() -> Any:
-    data = request.json
-    if not data:
-        logger.warning("Update LLM settings called with no JSON data.")
-        return jsonify({"error": "No data provided."}), 400
-
-    new_provider_name: Optional[str] = data.get('provider_name')
-    new_model_name: Optional[str] = data.get('model_name')
-
-    if not new_provider_name:
-        logger.warning("Update LLM settings called without 'provider_name'.")
-        return jsonify({"error": "Provider name is required to update LLM settings."}), 400
+    req = parse_json_body(LlmSettingsUpdateRequest)
+    new_provider_name: str = req.provider_name
+    new_model_name: Optional[str] = req.model_name
 
     flask_session['current_provider_name'] = new_provider_name
     flask_session['current_model_name'] = new_model_name if new_model_name else None
 
-    logger.info(f"Flask session LLM settings updated by /llm/update: Provider={flask_session['current_provider_name']}, Model={flask_session['current_model_name']}")
+    logger.info("Flask session LLM settings updated by /llm/update: Provider=%s, Model=%s", flask_session['current_provider_name'], flask_session['current_model_name'])
 
     # Log the state of the session immediately after update for debugging
     if logger.isEnabledFor(logging.DEBUG):
@@ -93,13 +103,13 @@ def update_llm_settings_route() -> Any:
             "current_model_name_in_flask": flask_session.get('current_model_name'),
             "flask_session_full_content_keys": list(flask_session.keys())
         }
-        logger.debug(f"FLASK_SESSION_STATE_SUMMARY (After /api/settings/llm/update): {session_details_after_update}")
+        logger.debug("FLASK_SESSION_STATE_SUMMARY (After /api/settings/llm/update): %s", session_details_after_update)
 
 
     if flask_session['current_model_name'] is None and llmcore_instance and llmcore_instance.config:
-        provider_default_model = llmcore_instance.config.get(f"providers.{new_provider_name}.default_model")
+        provider_default_model = get_default_model_name(new_provider_name)
         flask_session['current_model_name'] = provider_default_model
-        logger.info(f"Model was empty for provider '{new_provider_name}', set to provider's default: {provider_default_model} in Flask session.")
+        logger.info("Model was empty for provider '%s', set to provider's default: %s in Flask session.", new_provider_name, provider_default_model)
 
     flask_session.modified = True
 
@@ -112,60 +122,83 @@ def update_llm_settings_route() -> Any:
     })
 
 @settings_bp.route("/system_message", methods=["GET"])
+@llmcore_optional
 def get_system_message_route() -> Any:
     system_msg = flask_session.get('system_message', "")
-    logger.debug(f"Retrieved system message from session: '{system_msg[:100]}...'")
+    logger.debug("Retrieved system message from session: '%s...'", system_msg[:100])
     return jsonify({"system_message": system_msg})
 
 @settings_bp.route("/system_message/update", methods=["POST"])
+@llmcore_optional
 def update_system_message_route() -> Any:
-    data = request.json
-    new_system_message: str = data.get('system_message', "") if data else ""
-    flask_session['system_message'] = new_system_message
-    flask_session.modified = True
-    logger.info(f"Flask session system_message updated: '{new_system_message[:100]}...'")
+    new_system_message: str = parse_json_body(SystemMessageUpdateRequest, allow_empty=True).system_message
+    if flask_session.get('system_message') == new_system_message:
+        logger.debug("System message unchanged; Flask session left untouched.")
+    else:
+        flask_session['system_message'] = new_system_message
+        flask_session.modified = True
+        logger.info("Flask session system_message updated: '%s...'", new_system_message[:100])
     return jsonify({
         "message": "System message updated in session.",
         "system_message": new_system_message
     })
 
 @settings_bp.route("/prompt_template_values", methods=["GET"])
+@llmcore_optional
 def get_prompt_template_values_route() -> Any:
     values = flask_session.get('prompt_template_values', {})
-    logger.debug(f"Retrieved prompt template values from session: {values}")
+    logger.debug("Retrieved prompt template values from session: %s", values)
     return jsonify({"prompt_template_values": values})
 
 @settings_bp.route("/prompt_template_values/update", methods=["POST"])
+@llmcore_optional
 def update_prompt_template_value_route() -> Any:
-    data = request.json
-    if not data or "key" not in data or "value" not in data:
-        logger.warning("Update prompt template value called without 'key' or 'value' in payload.")
-        return jsonify({"error": "Missing 'key' or 'value' for prompt template update."}), 400
-    key_to_update = str(data["key"]); value_to_update = str(data["value"])
+    req = parse_json_body(PromptTemplateValueRequest)
+    key_to_update = req.key; value_to_update = req.value
     if 'prompt_template_values' not in flask_session or not isinstance(flask_session['prompt_template_values'], dict):
         flask_session['prompt_template_values'] = {}
     flask_session['prompt_template_values'][key_to_update] = value_to_update
     flask_session.modified = True
-    logger.info(f"Prompt template value updated/added in session: {key_to_update} = '{value_to_update}'")
+    logger.info("Prompt template value updated/added in session: %s = '%s'", key_to_update, value_to_update)
     return jsonify({"prompt_template_values": flask_session['prompt_template_values']})
 
+@settings_bp.route("/prompt_template_values/batch_update", methods=["POST"])
+@llmcore_optional
+def batch_update_prompt_template_values_route() -> Any:
+    """
+    Merges several prompt template values into the Flask session in one write.
+    Expects JSON payload: {"values": {"key1": "value1", "key2": "value2"}}
+    The merged dict replaces the stored one, so the session is serialized once
+    per call, and not at all if nothing changed.
+    """
+    req = parse_json_body(PromptTemplateBatchUpdateRequest)
+    current_values = flask_session.get('prompt_template_values')
+    if not isinstance(current_values, dict):
+        current_values = {}
+    merged_values = {**current_values, **req.values}
+    if merged_values != current_values or 'prompt_template_values' not in flask_session:
+        flask_session['prompt_template_values'] = merged_values
+        flask_session.modified = True
+        logger.info("Prompt template values batch-updated in session: %s key(s).", len(req.values))
+    else:
+        logger.debug("Prompt template batch update carried no changes; session left untouched.")
+    return jsonify({"prompt_template_values": merged_values})
+
 @settings_bp.route("/prompt_template_values/delete_key", methods=["POST"])
+@llmcore_optional
 def delete_prompt_template_value_route() -> Any:
-    data = request.json
-    if not data or "key" not in data:
-        logger.warning("Delete prompt template value called without 'key' in payload.")
-        return jsonify({"error": "Missing 'key' for prompt template value deletion."}), 400
-    key_to_delete = str(data["key"])
+    key_to_delete = parse_json_body(PromptTemplateKeyRequest).key
     if 'prompt_template_values' in flask_session and isinstance(flask_session['prompt_template_values'], dict):
         if key_to_delete in flask_session['prompt_template_values']:
             del flask_session['prompt_template_values'][key_to_delete]
             flask_session.modified = True
-            logger.info(f"Prompt template value deleted from session for key: {key_to_delete}")
+            logger.info("Prompt template value deleted from session for key: %s", key_to_delete)
         else:
-            logger.warning(f"Attempted to delete non-existent prompt template key from session: {key_to_delete}")
+            logger.warning("Attempted to delete non-existent prompt template key from session: %s", key_to_delete)
     return jsonify({"prompt_template_values": flask_session.get('prompt_template_values', {})})
 
 @settings_bp.route("/prompt_template_values/clear_all", methods=["POST"])
+@llmcore_optional
 def clear_all_prompt_template_values_route() -> Any:
     flask_session['prompt_template_values'] = {}
     flask_session.modified = True
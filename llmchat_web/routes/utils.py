@@ -0,0 +1,349 @@
+# llmchat_web/routes/utils.py
+"""
+Shared helpers for the llmchat-web route modules.
+
+Holds small pieces of infrastructure used by more than one blueprint, such as
+the in-process TTL caches for slow-changing listings and session-derived
+responses, and the helper that wraps pre-serialized JSON bodies in a Flask
+response.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List,
+    Optional, Tuple, Type, TypeVar, Union
+)
+
+import orjson
+from flask import Response, request, stream_with_context
+from pydantic import BaseModel, TypeAdapter
+from werkzeug.exceptions import RequestEntityTooLarge
+
+logger = logging.getLogger("llmchat_web.routes.utils")
+
+RequestModelT = TypeVar("RequestModelT", bound=BaseModel)
+ResultT = TypeVar("ResultT")
+ItemT = TypeVar("ItemT")
+
+
+class TTLCache:
+    """
+    A small, thread-safe LRU cache whose entries expire after a fixed TTL.
+
+    Flask serves requests on worker threads, and each thread drives its own
+    persistent asyncio event loop (see `get_or_create_event_loop` in app.py).
+    State shared between requests is therefore guarded with a `threading.Lock`
+    rather than an `asyncio.Lock`, which would be bound to a single loop.
+    """
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 128) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for `key`, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores `value` under `key`, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """Drops every entry, or only those whose key satisfies `predicate`."""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key so only one of them does the work.
+
+    The first caller for a key runs the coroutine; callers arriving while it is in
+    flight await the same outcome (result or exception). Callers may sit on
+    different worker threads, each with its own event loop, so the shared outcome
+    is a `concurrent.futures.Future` awaited through `asyncio.wrap_future`.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, "concurrent.futures.Future[Any]"] = {}
+        self._lock = threading.Lock()
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[ResultT]]) -> ResultT:
+        """Runs `call()` for `key`, or joins the identical call already in flight."""
+        with self._lock:
+            shared = self._inflight.get(key)
+            is_leader = shared is None
+            if shared is None:
+                shared = concurrent.futures.Future()
+                # Marked running so a cancelled follower cannot cancel it for everyone.
+                shared.set_running_or_notify_cancel()
+                self._inflight[key] = shared
+        if not is_leader:
+            logger.debug("Joining in-flight call for key %s.", key)
+            return await asyncio.wrap_future(shared)
+        try:
+            result = await call()
+        except BaseException as exc:
+            shared.set_exception(exc)
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+async def batched(
+    source: AsyncIterator[ItemT],
+    max_delay: float,
+    max_items: int,
+    flush_on: Optional[Callable[[ItemT], bool]] = None,
+    max_weight: Optional[int] = None,
+    weigh: Callable[[ItemT], int] = len,
+) -> AsyncGenerator[List[ItemT], None]:
+    """
+    Regroups the items of `source` into lists, each flushed once it holds
+    `max_items` items or `max_delay` seconds after its first item, whichever
+    comes first. With `max_weight`, a list is also flushed once the summed
+    `weigh(item)` of its items (by default their length) reaches it. Items
+    matching `flush_on` are never held back: the pending list is flushed and
+    the item is then yielded on its own.
+
+    `source` is drained into a queue by a pump task, and a single `queue.get()`
+    task is kept across deadlines, so neither a step of the source generator
+    nor an already dequeued item is lost to a timeout. Closing this generator
+    cancels the pump and closes `source`.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Tuple[Any, Optional[BaseException]]]" = asyncio.Queue()
+    exhausted = object()
+
+    async def pump() -> None:
+        try:
+            async for item in source:
+                queue.put_nowait((item, None))
+        except Exception as exc:
+            queue.put_nowait((exhausted, exc))
+        else:
+            queue.put_nowait((exhausted, None))
+
+    pump_task = asyncio.create_task(pump())
+    get_task: Optional["asyncio.Future[Tuple[Any, Optional[BaseException]]]"] = None
+    try:
+        pending: List[ItemT] = []
+        pending_weight = 0
+        deadline = 0.0
+        while True:
+            if get_task is None:
+                get_task = asyncio.ensure_future(queue.get())
+            timeout = max(deadline - loop.time(), 0) if pending else None
+            await asyncio.wait({get_task}, timeout=timeout)
+            if not get_task.done():
+                yield pending
+                pending, pending_weight = [], 0
+                continue
+            item, error = get_task.result()
+            get_task = None
+            if item is exhausted:
+                if pending:
+                    yield pending
+                if error is not None:
+                    raise error
+                return
+            if flush_on is not None and flush_on(item):
+                if pending:
+                    yield pending
+                    pending, pending_weight = [], 0
+                yield [item]
+                continue
+            if not pending:
+                deadline = loop.time() + max_delay
+            pending.append(item)
+            if max_weight is not None:
+                pending_weight += weigh(item)
+            if len(pending) >= max_items or (max_weight is not None and pending_weight >= max_weight):
+                yield pending
+                pending, pending_weight = [], 0
+    finally:
+        if get_task is not None:
+            get_task.cancel()
+        pump_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await pump_task
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+# Listings of RAG collections, providers and models change on the order of
+# minutes, while the UI re-requests them every time a settings panel opens.
+LISTING_CACHE_TTL_SECONDS = 45.0
+listing_cache = TTLCache(ttl_seconds=LISTING_CACHE_TTL_SECONDS, maxsize=64)
+
+# Context previews are re-requested with identical inputs while the user edits
+# the prompt. Entries are keyed by (session_id, request_fingerprint) so they can
+# be dropped per session whenever its history or workspace changes.
+PREVIEW_CACHE_TTL_SECONDS = 30.0
+preview_cache = TTLCache(ttl_seconds=PREVIEW_CACHE_TTL_SECONDS, maxsize=1024)
+
+# Staged messages and workspace items resolved for a (session_id,
+# request_fingerprint) pair. The UI sends the same staged list with every preview
+# while the user types and again with the chat submission. Staged files are not
+# held here: they are re-checked on each request against their mtime and size.
+STAGED_ITEMS_CACHE_TTL_SECONDS = 10.0
+staged_items_cache = TTLCache(ttl_seconds=STAGED_ITEMS_CACHE_TTL_SECONDS, maxsize=256)
+
+
+def _fingerprint_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Returns a stable SHA-256 hex digest of JSON-serializable request inputs (pydantic models included)."""
+    return hashlib.sha256(
+        orjson.dumps(parts, default=_fingerprint_default, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+
+
+def invalidate_session_caches(session_id: Optional[str]) -> None:
+    """Drops cached responses derived from a session's history or workspace items."""
+    preview_cache.invalidate(lambda key: key[0] == session_id)
+    staged_items_cache.invalidate(lambda key: key[0] == session_id)
+
+
+# JSON bodies declaring a larger Content-Length are refused with a 413 before
+# being read. Sized for a chat carrying several staged texts at the staging limit.
+MAX_JSON_BODY_BYTES = int(os.environ.get("LLMCHAT_WEB_MAX_JSON_BODY_BYTES", 32 * 1024 * 1024))
+
+
+def parse_json_body(model_cls: Type[RequestModelT], allow_empty: bool = False) -> RequestModelT:
+    """
+    Validates the raw request body against `model_cls` in one pydantic-core pass.
+    Invalid payloads raise `pydantic.ValidationError`, answered with a 400 by the
+    app-level error handler. With `allow_empty`, a missing body is treated as `{}`.
+
+    The body is read once, without form parsing and without being cached on the
+    request, so a large payload is not held twice while it is validated.
+    """
+    if request.content_length is not None and request.content_length > MAX_JSON_BODY_BYTES:
+        raise RequestEntityTooLarge()
+    body = request.get_data(cache=False, parse_form_data=False)
+    if not body and allow_empty:
+        body = b"{}"
+    return model_cls.model_validate_json(body)
+
+
+# Lists longer than this are serialized on a worker thread (see `dump_json_list`).
+OFFLOAD_DUMP_MIN_ITEMS = 32
+
+
+async def dump_json_list(adapter: TypeAdapter, values: List[Any]) -> bytes:
+    """
+    Dumps `values` to JSON bytes with `adapter`. Long lists are dumped via
+    `asyncio.to_thread` so the event loop keeps serving other awaits meanwhile;
+    short ones are dumped inline, where a thread hop would cost more than it saves.
+    """
+    if len(values) > OFFLOAD_DUMP_MIN_ITEMS:
+        return await asyncio.to_thread(adapter.dump_json, values)
+    return adapter.dump_json(values)
+
+
+def json_response(body: Union[bytes, str], status: int = 200) -> Response:
+    """Wraps an already-serialized JSON body (e.g. from `model_dump_json`) in a Flask response."""
+    return Response(body, status=status, mimetype="application/json")
+
+
+def sse_response(frames: Iterable[bytes], status: int = 200) -> Response:
+    """
+    Wraps an iterable of Server-Sent Events frames in a streaming response.
+    Caching and proxy buffering are disabled (`X-Accel-Buffering: no` for nginx),
+    so each frame reaches the client as soon as it is yielded.
+
+    Frames must already be UTF-8 encoded `bytes`: the response is marked
+    `direct_passthrough`, so Werkzeug hands them to the server without its
+    per-item encoding pass.
+    """
+    response = Response(stream_with_context(frames), status=status, mimetype="text/event-stream")
+    response.direct_passthrough = True
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def json_stream_response(frames: Iterable[bytes], status: int = 200) -> Response:
+    """
+    Streams one JSON document written in pieces (already UTF-8 encoded `bytes`),
+    with the same no-cache and no-proxy-buffering headers (and `direct_passthrough`)
+    as `sse_response`. The status is sent before the body is complete, so a
+    failure partway through has to be reported inside the document itself.
+    """
+    response = Response(stream_with_context(frames), status=status, mimetype="application/json")
+    response.direct_passthrough = True
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson() -> bool:
+    """True if the client asked for newline-delimited JSON (`?format=ndjson` or via Accept)."""
+    if request.args.get("format") in ("ndjson", "jsonl"):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(models: Iterable[Any]) -> Response:
+    """
+    Streams pydantic models as newline-delimited JSON, one model per line,
+    serializing each only as the previous line has been handed to the server.
+    """
+    def generate_lines() -> Iterator[bytes]:
+        for model in models:
+            # The serializer's to_json() returns bytes, skipping model_dump_json()'s str round-trip.
+            yield model.__pydantic_serializer__.to_json(model) + b"\n"
+    response = Response(generate_lines(), mimetype=NDJSON_MIMETYPE)
+    response.direct_passthrough = True
+    return response
+
+
+def ndjson_stream_response(lines: Iterable[bytes], status: int = 200) -> Response:
+    """
+    Streams already-encoded NDJSON lines with the same no-cache and
+    no-proxy-buffering headers (and `direct_passthrough`) as `sse_response`.
+    """
+    response = Response(stream_with_context(lines), status=status, mimetype=NDJSON_MIMETYPE)
+    response.direct_passthrough = True
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
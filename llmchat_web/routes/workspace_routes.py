@@ -5,13 +5,21 @@ Handles operations on session-specific workspace items (context pool)
 and context preview functionalities.
 """
 import logging
-from typing import Any, Dict, List, Union # Added List, Union for type hinting
+from typing import Any, Dict, List, Optional, Union # Added List, Union for type hinting
 
-from flask import jsonify, request
+from flask import jsonify
 from flask import session as flask_session
+from pydantic import TypeAdapter
 
 # Import the specific blueprint defined in the routes package's __init__.py
 from . import workspace_bp
+from .utils import (
+    SingleFlight, dump_json_list, invalidate_session_caches, json_response, parse_json_body,
+    preview_cache, request_fingerprint
+)
+from ..models import (
+    ContextPreviewRequest, StagedItemSpec, WorkspaceFileRequest, WorkspaceMessageRequest, WorkspaceTextRequest
+)
 
 # Import shared components from the main app module (llmchat_web.app)
 from ..app import (
@@ -47,7 +55,7 @@ except ImportError:
     # Define a dummy function to prevent NameError if import fails,
     # though this means preview will not work correctly.
     async def _resolve_staged_items_for_core(
-        staged_items_from_js: List[Dict[str, Any]],
+        staged_items_from_js: List[StagedItemSpec],
         session_id_for_staging: Any
     ) -> List[Union[Any, Any]]: # Use generic Any here for the dummy
         logger_ws_init.error("Dummy _resolve_staged_items_for_core called due to import error!")
@@ -63,6 +71,14 @@ if not logger.handlers and app_logger:
     else:
         logger.setLevel(app_logger.level if app_logger else logging.DEBUG)
 
+# Serialize whole response payloads in a single pass through pydantic-core,
+# instead of dumping item by item to Python dicts and re-encoding via jsonify.
+_ITEMS_ADAPTER = TypeAdapter(List[LLMCoreContextItem])
+_PREVIEW_ADAPTER = TypeAdapter(Dict[str, Any])
+
+# Identical previews requested concurrently (several tabs, quick retries) share one build.
+_preview_flight = SingleFlight()
+
 
 # --- Workspace (Session Context Item) Management API Endpoints ---
 # workspace_bp has url_prefix='/api/sessions'.
@@ -74,15 +90,11 @@ async def list_workspace_items_route(session_id: str) -> Any:
     """
     Lists all workspace items (LLMCore ContextItems) for a given session.
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to list workspace items for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         logger.debug(f"Listing workspace items for session: {session_id}")
         items = await llmcore_instance.get_session_context_items(session_id)
-        item_list_json = [item.model_dump(mode="json") for item in items]
-        logger.info(f"Successfully listed {len(item_list_json)} workspace items for session {session_id}.")
-        return jsonify(item_list_json)
+        logger.info(f"Successfully listed {len(items)} workspace items for session {session_id}.")
+        return json_response(await dump_json_list(_ITEMS_ADAPTER, items))
     except SessionNotFoundError:
         logger.warning(f"Session {session_id} not found when listing workspace items.")
         return jsonify({"error": "Session not found."}), 404
@@ -100,15 +112,12 @@ async def get_workspace_item_route(session_id: str, item_id: str) -> Any:
     """
     Retrieves a specific workspace item by its ID from a given session.
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to get workspace item {item_id} for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         logger.debug(f"Getting workspace item '{item_id}' for session: {session_id}")
         item = await llmcore_instance.get_context_item(session_id, item_id)
         if item:
             logger.info(f"Successfully retrieved workspace item '{item_id}' for session {session_id}.")
-            return jsonify(item.model_dump(mode="json"))
+            return json_response(item.model_dump_json())
         else:
             logger.warning(f"Workspace item '{item_id}' not found in session {session_id}.")
             return jsonify({"error": "Workspace item not found."}), 404
@@ -130,17 +139,9 @@ async def add_text_to_workspace_route(session_id: str) -> Any:
     Adds a text snippet as a new workspace item to the specified session.
     Expects JSON payload: {"content": "your text", "item_id": "optional_custom_id"}
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to add text to workspace for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
-    data = request.json
-    if not data or "content" not in data:
-        logger.warning(f"Add text to workspace for session {session_id} called without 'content' in payload.")
-        return jsonify({"error": "Missing 'content' in request payload."}), 400
-
-    content: str = data["content"]
-    item_id: Optional[str] = data.get("item_id") # Optional custom ID from client
+    req = parse_json_body(WorkspaceTextRequest)
+    content: str = req.content
+    item_id: Optional[str] = req.item_id # Optional custom ID from client
 
     try:
         logger.debug(f"Adding text to workspace for session {session_id}. Custom ID: {item_id}")
@@ -150,7 +151,8 @@ async def add_text_to_workspace_route(session_id: str) -> Any:
             item_id=item_id # Pass along if provided
         )
         logger.info(f"Successfully added text item '{added_item.id}' to workspace for session {session_id}.")
-        return jsonify(added_item.model_dump(mode="json")), 201 # 201 Created
+        invalidate_session_caches(session_id)
+        return json_response(added_item.model_dump_json(), status=201) # 201 Created
     except SessionNotFoundError:
         logger.warning(f"Session {session_id} not found when adding text to workspace.")
         return jsonify({"error": "Session not found."}), 404
@@ -169,17 +171,9 @@ async def add_file_to_workspace_route(session_id: str) -> Any:
     Adds a server-side file's content as a new workspace item to the specified session.
     Expects JSON payload: {"file_path": "/path/to/file_on_server", "item_id": "optional_custom_id"}
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to add file to workspace for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
-    data = request.json
-    if not data or "file_path" not in data:
-        logger.warning(f"Add file to workspace for session {session_id} called without 'file_path' in payload.")
-        return jsonify({"error": "Missing 'file_path' in request payload."}), 400
-
-    file_path: str = data["file_path"]
-    item_id: Optional[str] = data.get("item_id") # Optional custom ID
+    req = parse_json_body(WorkspaceFileRequest)
+    file_path: str = req.file_path
+    item_id: Optional[str] = req.item_id # Optional custom ID
 
     try:
         logger.debug(f"Adding file '{file_path}' to workspace for session {session_id}. Custom ID: {item_id}")
@@ -189,7 +183,8 @@ async def add_file_to_workspace_route(session_id: str) -> Any:
             item_id=item_id # Pass along if provided
         )
         logger.info(f"Successfully added file item '{added_item.id}' (from path: {file_path}) to workspace for session {session_id}.")
-        return jsonify(added_item.model_dump(mode="json")), 201 # 201 Created
+        invalidate_session_caches(session_id)
+        return json_response(added_item.model_dump_json(), status=201) # 201 Created
     except FileNotFoundError: # Raised by LLMCore if file_path is invalid
         logger.warning(f"File not found at server path '{file_path}' when adding to workspace for session {session_id}.")
         return jsonify({"error": f"File not found at server path: {file_path}"}), 404
@@ -210,14 +205,12 @@ async def remove_workspace_item_route(session_id: str, item_id: str) -> Any:
     """
     Removes a workspace item by its ID from the specified session.
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to remove workspace item {item_id} for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
     try:
         logger.info(f"Attempting to remove workspace item '{item_id}' from session '{session_id}'.")
         success = await llmcore_instance.remove_context_item(session_id, item_id)
         if success:
             logger.info(f"Successfully removed workspace item '{item_id}' from session '{session_id}'.")
+            invalidate_session_caches(session_id)
             return jsonify({"message": f"Workspace item '{item_id}' removed successfully."})
         else:
             # LLMCore's remove_context_item might return False if item not found
@@ -241,15 +234,7 @@ async def add_message_to_workspace_route(session_id: str) -> Any:
     Adds content of a specific message from the session's history to its workspace items.
     Expects JSON payload: {"message_id": "id_of_message_to_add"}
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to add message to workspace for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
-    data = request.json
-    if not data or "message_id" not in data:
-        logger.warning(f"Add message to workspace for session {session_id} called without 'message_id' in payload.")
-        return jsonify({"error": "Missing 'message_id' in request payload."}), 400
-    message_id_to_add: str = data["message_id"]
+    message_id_to_add: str = parse_json_body(WorkspaceMessageRequest).message_id
 
     try:
         logger.debug(f"Attempting to add message '{message_id_to_add}' to workspace for session '{session_id}'.")
@@ -258,7 +243,9 @@ async def add_message_to_workspace_route(session_id: str) -> Any:
             logger.warning(f"Session {session_id} not found when trying to add message {message_id_to_add} to workspace.")
             return jsonify({"error": "Session not found."}), 404 # Defensive
 
-        message_to_add = next((m for m in session_obj.messages if m.id == message_id_to_add), None)
+        # Messages added to the workspace are usually recent ones, so scan from the
+        # newest end; a single lookup does not justify building an id index.
+        message_to_add = next((m for m in reversed(session_obj.messages) if m.id == message_id_to_add), None)
         if not message_to_add:
             logger.warning(f"Message '{message_id_to_add}' not found in session '{session_id}' to add to workspace.")
             return jsonify({"error": "Message not found in session."}), 404
@@ -276,7 +263,8 @@ async def add_message_to_workspace_route(session_id: str) -> Any:
             }
         )
         logger.info(f"Successfully added message '{message_id_to_add}' as workspace item '{added_item.id}' for session {session_id}.")
-        return jsonify(added_item.model_dump(mode="json")), 201 # 201 Created
+        invalidate_session_caches(session_id)
+        return json_response(added_item.model_dump_json(), status=201) # 201 Created
     except SessionNotFoundError:
         logger.warning(f"Session {session_id} not found when adding message {message_id_to_add} to workspace.")
         return jsonify({"error": "Session not found."}), 404
@@ -305,26 +293,38 @@ async def preview_context_route(session_id: str) -> Any:
         "staged_items": "Optional: Array of client-side staged items to include in preview."
     }
     """
-    if not llmcore_instance:
-        logger.error(f"Attempted to preview context for session {session_id}, but LLM service is not available.")
-        return jsonify({"error": "LLM service not available."}), 503
-
-    data = request.json
-    current_query_for_preview: Optional[str] = data.get("current_query") if data else None
-    staged_items_from_js: List[Dict[str, Any]] = data.get("staged_items", []) if data else []
+    req = parse_json_body(ContextPreviewRequest, allow_empty=True)
+    current_query_for_preview: Optional[str] = req.current_query
+    staged_items_from_js: List[StagedItemSpec] = req.staged_items
 
     logger.debug(f"Previewing context for session {session_id}. Query: '{current_query_for_preview}'. Staged items from JS: {len(staged_items_from_js)}")
 
-    try:
+    # Retrieve provider and model from session to pass to core and to enrich response
+    provider_name = flask_session.get('current_provider_name')
+    model_name = flask_session.get('current_model_name')
+
+    # Identical previews are served from a short-lived cache. Entries for a session
+    # are dropped as soon as its history or workspace changes.
+    cache_key = (session_id, request_fingerprint(
+        current_query_for_preview, staged_items_from_js,
+        flask_session.get('system_message'), provider_name, model_name,
+        flask_session.get('rag_enabled', False), flask_session.get('rag_collection_name'),
+        flask_session.get('rag_k_value'), flask_session.get('rag_filter'),
+        flask_session.get('prompt_template_values', {}),
+    ))
+    cached_body = preview_cache.get(cache_key)
+    if cached_body is not None:
+        logger.debug(f"Serving context preview for session {session_id} from cache.")
+        response = json_response(cached_body)
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+    async def _build_preview() -> bytes:
         # Resolve client-side staged items into LLMCore objects
         # This helper is currently imported from chat_routes.
         explicitly_staged_items_for_core: List[Union[Any, Any]] = \
             await _resolve_staged_items_for_core(staged_items_from_js, session_id)
 
-        # Retrieve provider and model from session to pass to core and to enrich response
-        provider_name = flask_session.get('current_provider_name')
-        model_name = flask_session.get('current_model_name')
-
         # Call LLMCore's preview method
         preview_details_dict = await llmcore_instance.preview_context_for_chat(
             current_user_query=current_query_for_preview or "", # Must be a string
@@ -351,8 +351,15 @@ async def preview_context_route(session_id: str) -> Any:
         preview_details_dict['model_name'] = model_name
         # --- END FIX ---
 
+        body = _PREVIEW_ADAPTER.dump_json(preview_details_dict)
+        preview_cache.set(cache_key, body)
         logger.info(f"Successfully generated context preview for session {session_id}.")
-        return jsonify(preview_details_dict) # Already a dict from model_dump
+        return body
+
+    try:
+        response = json_response(await _preview_flight.run(cache_key, _build_preview))
+        response.headers["X-Cache"] = "MISS"
+        return response
     except SessionNotFoundError:
         logger.warning(f"Session {session_id} not found when generating context preview.")
         return jsonify({"error": "Session not found."}), 404
@@ -84,111 +84,120 @@ async function handleIngestionFormSubmit(ingestType, formData) {
 
         if (line.startsWith("data: ")) {
           try {
-            const eventData = JSON.parse(line.substring(6));
-            console.log("INGEST_UI SSE Event:", eventData);
+            // The server coalesces bursts of events into one array frame.
+            const parsed = JSON.parse(line.substring(6));
+            const events = Array.isArray(parsed) ? parsed : [parsed];
+            for (const eventData of events) {
+              console.log("INGEST_UI SSE Event:", eventData);
 
-            if (eventData.type === "file_start") {
-              totalFilesFromEvent =
-                eventData.total_files || totalFilesFromEvent;
-              $resultMsg.html(
-                `Processing file <strong>${escapeHtml(eventData.filename)}</strong> (${eventData.file_index + 1} of ${totalFilesFromEvent})...`,
-              );
-              $progressBar.text(
-                `File ${eventData.file_index + 1}/${totalFilesFromEvent}`,
-              );
-            } else if (eventData.type === "file_end") {
-              filesProcessedInStream++;
-              const progressPercent =
-                totalFilesFromEvent > 0
-                  ? (filesProcessedInStream / totalFilesFromEvent) * 100
-                  : 50;
-              $progressBar
-                .css("width", `${progressPercent}%`)
-                .attr("aria-valuenow", progressPercent);
-              if (eventData.status === "success") {
-                $resultMsg.append(
-                  `<br><small class="text-success">- File <strong>${escapeHtml(eventData.filename)}</strong> processed successfully. Chunks added: ${eventData.chunks_added || 0}</small>`,
+              if (eventData.type === "file_start") {
+                totalFilesFromEvent =
+                  eventData.total_files || totalFilesFromEvent;
+                $resultMsg.html(
+                  `Processing file <strong>${escapeHtml(eventData.filename)}</strong> (${eventData.file_index + 1} of ${totalFilesFromEvent})...`,
                 );
-              } else {
-                $resultMsg.append(
-                  `<br><small class="text-danger">- File <strong>${escapeHtml(eventData.filename)}</strong> failed: ${escapeHtml(eventData.error_message || "Unknown error")}</small>`,
+                $progressBar.text(
+                  `File ${eventData.file_index + 1}/${totalFilesFromEvent}`,
                 );
-                $progressBar.addClass("bg-warning");
-              }
-            } else if (eventData.type === "ingestion_start") {
-              $resultMsg.html(
-                `Starting ingestion for <strong>${escapeHtml(eventData.ingest_type)}</strong> into collection <strong>${escapeHtml(eventData.collection_name)}</strong>...`,
-              );
-              $progressBar
-                .css("width", `25%`)
-                .attr("aria-valuenow", 25)
-                .text("Processing...");
-            } else if (eventData.type === "ingestion_complete") {
-              const summary = eventData.summary;
-              $progressBar.css("width", "100%").attr("aria-valuenow", 100);
-              if (
-                summary.status === "success" ||
-                (summary.files_with_errors !== undefined &&
-                  summary.files_with_errors === 0)
-              ) {
-                $progressBar.addClass("bg-success").text("Complete!");
-                $resultMsg
-                  .removeClass("text-muted text-danger")
-                  .addClass("text-success")
-                  .html(`<strong>Success!</strong> ${escapeHtml(summary.message) || "Ingestion completed."}<br>
-                                           Total Files Submitted: ${summary.total_files_submitted || "N/A"}<br>
-                                           Files Processed Successfully: ${summary.files_processed_successfully || "N/A"}<br>
-                                           Files With Errors: ${summary.files_with_errors || 0}<br>
-                                           Total Chunks Added: ${summary.total_chunks_added_to_db || 0}<br>
-                                           Target Collection: ${escapeHtml(summary.collection_name)}`);
-              } else {
+              } else if (eventData.type === "file_end") {
+                filesProcessedInStream++;
+                const progressPercent =
+                  totalFilesFromEvent > 0
+                    ? (filesProcessedInStream / totalFilesFromEvent) * 100
+                    : 50;
                 $progressBar
-                  .addClass("bg-danger")
-                  .text("Completed with Errors!");
-                let errorDetailsHtml = "";
-                if (
-                  summary.error_messages &&
-                  summary.error_messages.length > 0
-                ) {
-                  errorDetailsHtml = "<br>Details:<ul>";
-                  summary.error_messages.forEach((err) => {
-                    errorDetailsHtml += `<li><small>${escapeHtml(err)}</small></li>`;
-                  });
-                  errorDetailsHtml += "</ul>";
+                  .css("width", `${progressPercent}%`)
+                  .attr("aria-valuenow", progressPercent);
+                if (eventData.status === "success") {
+                  $resultMsg.append(
+                    `<br><small class="text-success">- File <strong>${escapeHtml(eventData.filename)}</strong> processed successfully. Chunks added: ${eventData.chunks_added || 0}</small>`,
+                  );
+                } else {
+                  $resultMsg.append(
+                    `<br><small class="text-danger">- File <strong>${escapeHtml(eventData.filename)}</strong> failed: ${escapeHtml(eventData.error_message || "Unknown error")}</small>`,
+                  );
+                  $progressBar.addClass("bg-warning");
                 }
-                $resultMsg
-                  .removeClass("text-muted text-success")
-                  .addClass("text-danger")
-                  .html(`<strong>Ingestion Completed with Errors!</strong> ${escapeHtml(summary.message) || ""}<br>
-                                           Total Files Submitted: ${summary.total_files_submitted || "N/A"}<br>
-                                           Files With Errors: ${summary.files_with_errors || "N/A"}<br>
-                                           Total Chunks Added: ${summary.total_chunks_added_to_db || 0}
-                                           ${errorDetailsHtml}`);
-              }
-              // fetchAndPopulateRagCollections is defined in rag_ui.js
-              if (typeof fetchAndPopulateRagCollections === "function") {
-                fetchAndPopulateRagCollections();
-              }
-              setTimeout(() => $progressContainer.fadeOut(), 3000);
-            } else if (eventData.type === "error") {
-              throw new Error(eventData.error);
-            } else if (eventData.type === "end") {
-              console.log(
-                "INGEST_UI: SSE stream 'end' event received from server for ingestion.",
-              );
-              if (
-                $progressBar.text() !== "Complete!" &&
-                $progressBar.text() !== "Completed with Errors!" &&
-                $progressBar.text() !== "Failed!"
-              ) {
+              } else if (eventData.type === "ingestion_start") {
+                $resultMsg.html(
+                  `Starting ingestion for <strong>${escapeHtml(eventData.ingest_type)}</strong> into collection <strong>${escapeHtml(eventData.collection_name)}</strong>...`,
+                );
                 $progressBar
-                  .css("width", "100%")
-                  .addClass("bg-warning")
-                  .text("Finished.");
-                $resultMsg.append(
-                  "<br><small>Ingestion process ended.</small>",
+                  .css("width", `25%`)
+                  .attr("aria-valuenow", 25)
+                  .text("Processing...");
+              } else if (eventData.type === "progress") {
+                // e.g. git clone phases: "Receiving objects" 42%
+                $progressBar.text(
+                  `${eventData.message} ${eventData.percent}%`,
                 );
+              } else if (eventData.type === "ingestion_complete") {
+                const summary = eventData.summary;
+                $progressBar.css("width", "100%").attr("aria-valuenow", 100);
+                if (
+                  summary.status === "success" ||
+                  (summary.files_with_errors !== undefined &&
+                    summary.files_with_errors === 0)
+                ) {
+                  $progressBar.addClass("bg-success").text("Complete!");
+                  $resultMsg
+                    .removeClass("text-muted text-danger")
+                    .addClass("text-success")
+                    .html(`<strong>Success!</strong> ${escapeHtml(summary.message) || "Ingestion completed."}<br>
+                                             Total Files Submitted: ${summary.total_files_submitted || "N/A"}<br>
+                                             Files Processed Successfully: ${summary.files_processed_successfully || "N/A"}<br>
+                                             Files With Errors: ${summary.files_with_errors || 0}<br>
+                                             Total Chunks Added: ${summary.total_chunks_added_to_db || 0}<br>
+                                             Target Collection: ${escapeHtml(summary.collection_name)}`);
+                } else {
+                  $progressBar
+                    .addClass("bg-danger")
+                    .text("Completed with Errors!");
+                  let errorDetailsHtml = "";
+                  if (
+                    summary.error_messages &&
+                    summary.error_messages.length > 0
+                  ) {
+                    errorDetailsHtml = "<br>Details:<ul>";
+                    summary.error_messages.forEach((err) => {
+                      errorDetailsHtml += `<li><small>${escapeHtml(err)}</small></li>`;
+                    });
+                    errorDetailsHtml += "</ul>";
+                  }
+                  $resultMsg
+                    .removeClass("text-muted text-success")
+                    .addClass("text-danger")
+                    .html(`<strong>Ingestion Completed with Errors!</strong> ${escapeHtml(summary.message) || ""}<br>
+                                             Total Files Submitted: ${summary.total_files_submitted || "N/A"}<br>
+                                             Files With Errors: ${summary.files_with_errors || "N/A"}<br>
+                                             Total Chunks Added: ${summary.total_chunks_added_to_db || 0}
+                                             ${errorDetailsHtml}`);
+                }
+                // fetchAndPopulateRagCollections is defined in rag_ui.js
+                if (typeof fetchAndPopulateRagCollections === "function") {
+                  fetchAndPopulateRagCollections();
+                }
                 setTimeout(() => $progressContainer.fadeOut(), 3000);
+              } else if (eventData.type === "error") {
+                throw new Error(eventData.error);
+              } else if (eventData.type === "end") {
+                console.log(
+                  "INGEST_UI: SSE stream 'end' event received from server for ingestion.",
+                );
+                if (
+                  $progressBar.text() !== "Complete!" &&
+                  $progressBar.text() !== "Completed with Errors!" &&
+                  $progressBar.text() !== "Failed!"
+                ) {
+                  $progressBar
+                    .css("width", "100%")
+                    .addClass("bg-warning")
+                    .text("Finished.");
+                  $resultMsg.append(
+                    "<br><small>Ingestion process ended.</small>",
+                  );
+                  setTimeout(() => $progressContainer.fadeOut(), 3000);
+                }
               }
             }
           } catch (e) {
@@ -110,10 +110,10 @@ function initPromptTemplateEventListeners() {
     }
     console.log(`PROMPT_UI: Adding prompt template value: ${key} = ${value}`);
     $.ajax({
-      url: "/api/settings/prompt_template_values/update",
+      url: "/api/settings/prompt_template_values/batch_update",
       type: "POST",
       contentType: "application/json",
-      data: JSON.stringify({ key: key, value: value }),
+      data: JSON.stringify({ values: { [key]: value } }),
       dataType: "json",
       success: function (response) {
         if (response && response.prompt_template_values) {
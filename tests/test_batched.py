@@ -0,0 +1,28 @@
+# tests/test_batched.py
+"""Tests for the `batched` async regrouping helper in llmchat_web.routes.utils."""
+
+import asyncio
+
+from llmchat_web.routes.utils import batched
+
+
+async def _flood(count: int):
+    for index in range(count):
+        yield index
+        if index % 7 == 0:
+            await asyncio.sleep(0)
+
+
+async def _collect(count: int, max_delay: float) -> list:
+    received = []
+    async for group in batched(_flood(count), max_delay=max_delay, max_items=1000):
+        assert group
+        received.extend(group)
+    return received
+
+
+def test_batched_keeps_every_item_when_deadlines_expire_under_load():
+    # A zero delay makes the deadline expire while `queue.get()` is completing.
+    count = 20000
+    assert asyncio.run(_collect(count, max_delay=0.0)) == list(range(count))
+    assert asyncio.run(_collect(count, max_delay=1e-5)) == list(range(count))